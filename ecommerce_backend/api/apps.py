@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from .search import FTS_TABLE, install_search_index
+    conn = connections[using]
+    tables = conn.introspection.table_names()
+    if FTS_TABLE in tables and 'api_product' in tables:
+        install_search_index(conn)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .sqlite import apply_sqlite_pragmas
+        post_migrate.connect(ensure_search_index, sender=self)
+        connection_created.connect(apply_sqlite_pragmas)
@@ -0,0 +1,167 @@
+from functools import wraps
+from types import SimpleNamespace
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.urls import re_path
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from . import fastpath
+from .catalog import facet_querysets, filter_products, keyset_ordering, sort_products, wants_facets
+from .catalog_cache import acached_response, is_cacheable_request
+from .categories import acategory_filter
+from .facets import afacet_counts
+from .models import Category, Product
+from .pagination import PageOrCursorPagination, PagePagination
+from .query_plans import PRODUCT_DETAIL_PLAN, PRODUCT_LIST_PLAN
+from .serializers import (
+    CategorySerializer, ProductListSerializer, ProductSerializer, PRODUCT_LIST_ROWS, PRODUCT_SEARCH_ROWS
+)
+from .views import CategoryViewSet, ProductViewSet
+
+# Async versions of the catalog read endpoints, routed in front of the DRF
+# viewsets when ASYNC_CATALOG_VIEWS is on. They serve JSON GETs with the
+# async ORM and cache API, so a request's thread is idle between queries
+# (Django still gives each ASGI request its own thread; see the README),
+# and render through the same serializers (over fully loaded objects)
+# or fastpath rows, so bodies are byte-identical to the viewsets'. Anything
+# else, including error responses, is handed to the DRF view.
+
+ALLOW = 'GET, HEAD, OPTIONS'
+
+
+def json_response(data):
+    # The headers DRF's finalize_response adds to a read-only viewset's response
+    response = fastpath.json_response(data)
+    response['Allow'] = ALLOW
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def falls_back_to(viewset, actions):
+    """
+    Serve JSON GETs with the decorated handler, and everything else, or any
+    GET the handler returns None for, with ``viewset``'s DRF view.
+    """
+    view = sync_to_async(viewset.as_view(actions))
+
+    def decorator(handler):
+        # DRF views are CSRF-exempt and check CSRF themselves on authenticated
+        # unsafe requests; keep that so non-GETs reach the DRF view unchanged
+        @csrf_exempt
+        @wraps(handler)
+        async def wrapper(request, **kwargs):
+            if request.method == 'GET' and is_cacheable_request(request):
+                response = await handler(request, **kwargs)
+                if response is not None:
+                    return response
+            return await view(request, **kwargs)
+        return wrapper
+    return decorator
+
+
+@falls_back_to(ProductViewSet, {'get': 'list'})
+async def product_list(request):
+    params = request.GET
+    category_q = await acategory_filter(params['category']) if params.get('category') else None
+    queryset = filter_products(PRODUCT_LIST_PLAN.apply(Product.objects.all()), params, category_q=category_q)
+    queryset = sort_products(queryset, params)
+    if params.get('search'):
+        if 'search_snippet' not in queryset.query.extra_select:
+            return None
+        rows = PRODUCT_SEARCH_ROWS
+    else:
+        rows = PRODUCT_LIST_ROWS
+
+    paginator = PageOrCursorPagination()
+    view = SimpleNamespace(get_keyset_ordering=lambda: keyset_ordering(params), keyset_row_fields=rows.columns)
+    try:
+        page = await paginator.apaginate_queryset(rows.values(queryset), Request(request), view)
+    except NotFound:
+        return None
+    data = paginator.get_paginated_response(rows.render(page)).data
+    if wants_facets(params):
+        data['facets'] = {
+            facet: await afacet_counts(facet, product_ids)
+            for facet, product_ids in facet_querysets(params, category_q)
+        }
+    return json_response(data)
+
+
+@falls_back_to(ProductViewSet, {'get': 'retrieve'})
+async def product_detail(request, pk):
+    async def render():
+        try:
+            product = await PRODUCT_DETAIL_PLAN.apply(Product.objects.all()).aget(pk=pk)
+        except (Product.DoesNotExist, ValueError, ValidationError):
+            return None
+        return json_response(ProductSerializer(product).data)
+    return await acached_response(request, render)
+
+
+@falls_back_to(ProductViewSet, {'get': 'featured'})
+async def featured_products(request):
+    async def render():
+        products = PRODUCT_LIST_PLAN.apply(Product.objects.filter(rating__gte=4.0))[:8]
+        return json_response(ProductListSerializer([product async for product in products], many=True).data)
+    return await acached_response(request, render)
+
+
+@falls_back_to(ProductViewSet, {'get': 'related'})
+async def related_products(request):
+    product_id = request.GET.get('product_id')
+    if not product_id:
+        return None
+
+    async def render():
+        try:
+            related = PRODUCT_LIST_PLAN.apply(
+                Product.objects.filter(related_by__product_id=product_id).order_by('related_by__rank')
+            )[:4]
+            products = [product async for product in related]
+            if not products:
+                source = await Product.objects.only('id', 'category').aget(id=product_id)
+                same_category = PRODUCT_LIST_PLAN.apply(
+                    Product.objects.filter(category_id=source.category_id).exclude(id=product_id)
+                )[:4]
+                products = [product async for product in same_category]
+        except (Product.DoesNotExist, ValueError):
+            return None
+        return json_response(ProductListSerializer(products, many=True).data)
+    return await acached_response(request, render)
+
+
+@falls_back_to(CategoryViewSet, {'get': 'list'})
+async def category_list(request):
+    async def render():
+        paginator = PagePagination()
+        try:
+            page = await paginator.apaginate_queryset(Category.objects.all(), Request(request))
+        except NotFound:
+            return None
+        return json_response(paginator.get_paginated_response(CategorySerializer(page, many=True).data).data)
+    return await acached_response(request, render)
+
+
+@falls_back_to(CategoryViewSet, {'get': 'products'})
+async def category_products(request, pk):
+    async def render():
+        try:
+            category = await Category.objects.aget(pk=pk)
+        except (Category.DoesNotExist, ValueError, ValidationError):
+            return None
+        products = PRODUCT_LIST_PLAN.apply(Product.objects.filter(category=category))
+        return json_response(ProductListSerializer([product async for product in products], many=True).data)
+    return await acached_response(request, render)
+
+
+# Same paths as the router's routes for these actions
+urlpatterns = [
+    re_path(r'^products/$', product_list),
+    re_path(r'^products/featured/$', featured_products),
+    re_path(r'^products/related/$', related_products),
+    re_path(r'^products/(?P<pk>[^/.]+)/$', product_detail),
+    re_path(r'^categories/$', category_list),
+    re_path(r'^categories/(?P<pk>[^/.]+)/products/$', category_products),
+]
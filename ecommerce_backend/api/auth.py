@@ -0,0 +1,79 @@
+import copy
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from .passwords import check_user_password, hash_password, password_pool
+
+# Every session-authenticated request resolves request.user from the user
+# id in the session. CachedModelBackend keeps those users in process for
+# USER_CACHE_TIMEOUT seconds; User saves and deletes drop the entry here
+# (see signals.py), other processes pick changes up when it expires.
+# Its password checks run in the password pool (passwords.py).
+
+
+class UserCache:
+    """In-process {user_id: (expires_at, user)} with a short TTL."""
+
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        # Requests may set attributes on their user (e.g. permission caches)
+        return copy.copy(entry[1])
+
+    def set(self, user):
+        timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 15)
+        if timeout <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {pk: entry for pk, entry in self._entries.items() if entry[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries = {}
+            self._entries[user.pk] = (now + timeout, copy.copy(user))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+user_cache = UserCache()
+
+
+class CachedModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            password_pool.run(hash_password, password)
+            return None
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                user_cache.set(user)
+        return user
@@ -0,0 +1,154 @@
+import sqlite3
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import connections, transaction
+from django.test.utils import override_settings
+from .models import Category, Product
+
+# Helpers shared by the benchmark_* management commands. Benchmarks run
+# inside a transaction that is always rolled back, or on a copy of the
+# database, so the rows they create never reach the real database.
+
+WORDS = (
+    'classic slim regular relaxed cotton linen denim wool leather canvas '
+    'summer winter casual formal running walking hiking kids mens womens '
+    'shirt jeans dress jacket sweater hoodie sneakers sandals boots socks '
+    'red blue black white green navy grey beige yellow pink striped floral'
+).split()
+
+SYLLABLES = 'ka lo mi nu ra se ti vo za be de fi go hu jo le ma ne po ru sa'.split()
+
+
+def make_vocabulary(rng, size=5000):
+    # Long-tail product vocabulary (brands, materials, model names) so that
+    # most search terms are selective, as they are in a real catalog.
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def scratch_transaction(using=None):
+    try:
+        with transaction.atomic(using=using):
+            yield
+            raise Rollback()
+    except Rollback:
+        pass
+
+
+def make_categories(count=8):
+    return Category.objects.bulk_create([
+        Category(name=f'Bench Category {i}', image='https://example.com/c.jpg')
+        for i in range(count)
+    ])
+
+
+def make_products(count, categories, rng, batch_size=5000, sku_prefix='BENCH', vocabulary=None):
+    vocabulary, weights = vocabulary or make_vocabulary(rng)
+    created = 0
+    while created < count:
+        batch = []
+        for i in range(created, min(count, created + batch_size)):
+            tail = rng.choices(vocabulary, weights, k=8)
+            name = ' '.join([rng.choice(WORDS), rng.choice(WORDS)] + tail[:2]).title()
+            description = ' '.join([rng.choice(WORDS) for _ in range(12)] + tail[2:])
+            price = Decimal(rng.randint(500, 20000)) / 100
+            batch.append(Product(
+                name=name,
+                description=description,
+                price=price,
+                original_price=price + Decimal(rng.randint(0, 2000)) / 100,
+                rating=Decimal(rng.randint(10, 50)) / 10,
+                sku=f'{sku_prefix}-{i}',
+                category=rng.choice(categories),
+                colors=rng.sample(['Red', 'Blue', 'Black', 'White', 'Green'], 2),
+                sizes=rng.sample(['S', 'M', 'L', 'XL'], 2),
+            ))
+        Product.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+CATALOG_REQUEST_WEIGHTS = {
+    'products.list': 40,
+    'products.detail': 30,
+    'products.related': 15,
+    'products.featured': 6,
+    'categories.list': 6,
+    'categories.products': 3,
+}
+
+
+def catalog_requests(rng, product_ids, category_ids, count):
+    """A (name, path) mix of catalog reads for the async catalog benchmark."""
+    names = list(CATALOG_REQUEST_WEIGHTS)
+    weights = list(CATALOG_REQUEST_WEIGHTS.values())
+    requests = []
+    for name in rng.choices(names, weights, k=count):
+        if name == 'products.list':
+            sort_by = rng.choice(['', '&sort_by=price_low', '&sort_by=rating', '&sort_by=newest'])
+            path = f'/api/products/?page={rng.randint(1, 20)}{sort_by}'
+        elif name == 'products.detail':
+            path = f'/api/products/{rng.choice(product_ids)}/'
+        elif name == 'products.related':
+            path = f'/api/products/related/?product_id={rng.choice(product_ids)}'
+        elif name == 'products.featured':
+            path = '/api/products/featured/'
+        elif name == 'categories.list':
+            path = '/api/categories/'
+        else:
+            path = f'/api/categories/{rng.choice(category_ids)}/products/'
+        requests.append((name, path))
+    return requests
+
+
+def copy_database(source, target, journal_mode=None):
+    """Copy the SQLite database at ``source`` to ``target`` with the online backup API."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        if journal_mode:
+            dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+    finally:
+        src.close()
+        dst.close()
+
+
+@contextmanager
+def use_database(name, conn_max_age, options, alias='default', **overrides):
+    """
+    Point ``alias`` at another SQLite file, with the given connection
+    settings and settings ``overrides``, for the duration of the block.
+    Connections already open in other threads are not closed.
+    """
+    database = connections.settings[alias]
+    saved = {key: database[key] for key in ('NAME', 'CONN_MAX_AGE', 'OPTIONS')}
+    connections[alias].close()
+    database.update(NAME=name, CONN_MAX_AGE=conn_max_age, OPTIONS=options)
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        connections[alias].close()
+        database.update(saved)
+
+
+def time_call(fn, repeat=5):
+    """Run ``fn`` ``repeat`` times and return (median_ms, best_ms, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings), result
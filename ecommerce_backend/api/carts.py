@@ -0,0 +1,146 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Sum, DecimalField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Cart, Product
+
+SUMMARY_TIMEOUT = 300
+CART_OPERATIONS = ('add', 'set', 'remove')
+MAX_BATCH_OPERATIONS = 100
+
+
+class CartBatchError(ValueError):
+    pass
+
+
+def summary_key(user_id):
+    return f'cart:summary:{user_id}'
+
+
+def cart_totals(queryset):
+    """Line-item total and item count of a cart queryset in one aggregate query."""
+    return queryset.order_by().aggregate(
+        total=Coalesce(
+            Sum(F('product__price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            Value(Decimal('0.00')),
+        ),
+        count=Coalesce(Sum('quantity'), Value(0)),
+    )
+
+
+def get_cart_summary(user):
+    key = summary_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        summary = cart_totals(Cart.objects.filter(user=user))
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart_summary(user_id):
+    # After commit, so a concurrent reader cannot re-cache pre-write totals
+    transaction.on_commit(lambda: cache.delete(summary_key(user_id)))
+
+
+def add_to_cart(user, product, quantity=1):
+    """Add a product to the cart, merging into its line if there already is one."""
+    with transaction.atomic():
+        item, created = Cart.objects.get_or_create(user=user, product=product, defaults={'quantity': quantity})
+        if not created:
+            Cart.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantity)
+            item.refresh_from_db(fields=['quantity', 'updated_at'])
+    invalidate_cart_summary(user.pk)
+    return item, created
+
+
+def lock_cart(user, product_ids=None):
+    """
+    Lock the user's cart lines (those for ``product_ids`` if given) for the
+    rest of the transaction. SQLite has no row locks, so there we take the
+    database write lock up front by touching the rows: a concurrent checkout
+    of the same cart waits, then sees it empty.
+    """
+    cart = Cart.objects.filter(user=user)
+    if product_ids is not None:
+        cart = cart.filter(product_id__in=product_ids)
+    if connection.features.has_select_for_update:
+        return cart.select_for_update()
+    cart.update(updated_at=timezone.now())
+    return cart
+
+
+def parse_cart_operations(operations):
+    """Validate a batch body into (op, product_id, quantity) tuples."""
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError('operations must be a non-empty list')
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise CartBatchError(f'At most {MAX_BATCH_OPERATIONS} operations per batch')
+
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+            raise CartBatchError(f'Operation {index}: op must be one of {", ".join(CART_OPERATIONS)}')
+        product_id, quantity = operation.get('product'), operation.get('quantity', 1)
+        if isinstance(product_id, bool) or not isinstance(product_id, int):
+            raise CartBatchError(f'Operation {index}: product must be a product id')
+        if operation['op'] == 'remove':
+            quantity = 0
+        elif isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < (operation['op'] == 'add'):
+            raise CartBatchError(f'Operation {index}: quantity must be a non-negative integer (positive for add)')
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
+
+def apply_cart_operations(user, operations):
+    """
+    Apply parsed operations in order, in one transaction: they are folded
+    into a final quantity per product, then written as one DELETE of the
+    emptied lines and one upsert on (user, product) of the rest. Returns
+    the resulting cart_state().
+    """
+    product_ids = {product_id for _, product_id, _ in operations}
+    with transaction.atomic():
+        current = dict(lock_cart(user, product_ids).values_list('product_id', 'quantity'))
+        quantities = dict(current)
+        for op, product_id, quantity in operations:
+            if op == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            else:
+                quantities[product_id] = quantity
+
+        removed = [product_id for product_id, quantity in quantities.items() if not quantity and product_id in current]
+        changed = {
+            product_id: quantity for product_id, quantity in quantities.items()
+            if quantity and quantity != current.get(product_id)
+        }
+        new = set(changed) - set(current)
+        missing = new - set(Product.objects.filter(id__in=new).values_list('id', flat=True)) if new else set()
+        if missing:
+            raise CartBatchError(f'Products not found: {", ".join(map(str, sorted(missing)))}')
+
+        if removed:
+            Cart.objects.filter(user=user, product_id__in=removed).delete()
+        if changed:
+            Cart.objects.bulk_create(
+                [Cart(user=user, product_id=product_id, quantity=quantity) for product_id, quantity in changed.items()],
+                update_conflicts=True, unique_fields=['user', 'product'], update_fields=['quantity', 'updated_at'],
+            )
+        if removed or changed:
+            invalidate_cart_summary(user.pk)
+    return cart_state(user)
+
+
+def cart_state(user):
+    """Compact cart (product ids instead of nested products) with totals, in one query."""
+    lines = Cart.objects.filter(user=user).order_by('id').values_list('id', 'product_id', 'quantity', 'product__price')
+    items = [
+        {'id': line_id, 'product': product_id, 'quantity': quantity, 'price': price}
+        for line_id, product_id, quantity, price in lines
+    ]
+    return {
+        'items': items,
+        'total': sum((item['price'] * item['quantity'] for item in items), Decimal('0.00')),
+        'count': sum(item['quantity'] for item in items),
+    }
@@ -0,0 +1,83 @@
+from .categories import category_filter
+from .facets import FACETS, facet_filter, parse_facet_param
+from .search import search_filter, search_products
+
+# Product listing query building shared by ProductViewSet and the async
+# catalog views (async_views.py). Nothing here touches the database except
+# category_filter, whose result the async views resolve up front and pass
+# in as ``category_q``.
+
+# sort_by values accepted by the product list; id breaks ties so that page
+# boundaries are stable and keyset cursors are unique
+PRODUCT_SORT_ORDERINGS = {
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'rating': ('-rating', '-id'),
+    'newest': ('-created_at', '-id'),
+}
+
+
+def filter_products(queryset, params, skip_facet=None, category_q=None):
+    # skip_facet leaves out one facet's own filter, so its counts show
+    # what selecting another value of it would return
+
+    # Filter by category
+    category = params.get('category', None)
+    if category and skip_facet != 'category':
+        queryset = queryset.filter(category_filter(category) if category_q is None else category_q)
+
+    # Filter by price range
+    if skip_facet != 'price':
+        min_price = params.get('min_price', None)
+        max_price = params.get('max_price', None)
+        if min_price:
+            queryset = queryset.filter(price__gte=min_price)
+        if max_price:
+            queryset = queryset.filter(price__lte=max_price)
+
+    # Filter by facet values: OR within a facet, AND across facets
+    for facet in ('color', 'size', 'price'):
+        values = parse_facet_param(params, facet)
+        if values and facet != skip_facet:
+            queryset = queryset.filter(facet_filter(facet, values))
+
+    # Full-text search over name and description
+    search = params.get('search', None)
+    if search:
+        if skip_facet is None:
+            queryset = search_products(queryset, search)
+        else:
+            queryset = queryset.filter(search_filter(search, queryset.db))
+
+    return queryset
+
+
+def sort_products(queryset, params):
+    sort_by = params.get('sort_by', None)
+    if sort_by in PRODUCT_SORT_ORDERINGS:
+        return queryset.order_by(*PRODUCT_SORT_ORDERINGS[sort_by])
+    if 'search_rank' in queryset.query.extra_select:
+        return queryset.order_by('search_rank', 'id')
+    return queryset
+
+
+def keyset_ordering(params):
+    # Search rank is not a column and cannot be seeked on, so cursor mode
+    # without sort_by pages search results in id order
+    return PRODUCT_SORT_ORDERINGS.get(params.get('sort_by', None), ('id',))
+
+
+def facet_querysets(params, category_q=None):
+    """
+    (facet, product_ids) for every facet: the products matching all other
+    filters as a values('id') queryset, or None when nothing is filtered.
+    """
+    from .models import Product
+    for facet in FACETS:
+        products = filter_products(Product.objects.all(), params, skip_facet=facet, category_q=category_q)
+        # Unfiltered counts come straight off the postings index
+        yield facet, products.values('id') if products.query.where else None
+
+
+def wants_facets(params):
+    return params.get('facets', '').lower() in ('1', 'true', 'yes')
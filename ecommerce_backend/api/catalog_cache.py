@@ -0,0 +1,226 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from .replicas import current_replica, primary_pinned
+
+# Rendered catalog responses are cached under the current catalog version.
+# Any Product/Category/Review write bumps the version (see signals.py), which
+# orphans every cached body at once; orphans simply expire. A body read from
+# a replica is only stored if that replica was synced at or after the
+# version, so a lagging replica cannot put old data under a new version.
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+REPLICA_VERSION_KEY = 'catalog:replica:{}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'catalog')]
+
+
+def get_timeout():
+    return getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def get_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so versions never repeat after a cache flush,
+        # otherwise an old ETag could match a different body
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    cache = get_cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(VERSION_KEY, version, timeout=None)
+        return version
+
+
+def bump_version_on_commit():
+    transaction.on_commit(bump_version)
+
+
+def mark_replica_synced(alias, version):
+    """Record that replica ``alias`` holds every write up to catalog ``version``."""
+    get_cache().set(REPLICA_VERSION_KEY.format(alias), version, timeout=None)
+
+
+def reads_are_current(version):
+    """
+    Whether this request's catalog reads reflect ``version``: they go to the
+    primary, or to a replica synced at or after it. Checked before rendering,
+    since a sync finishing mid-request says nothing about rows already read.
+    """
+    alias = current_replica()
+    if alias is None:
+        return True
+    synced = get_cache().get(REPLICA_VERSION_KEY.format(alias))
+    return synced is not None and synced >= version
+
+
+async def areads_are_current(version):
+    alias = current_replica()
+    if alias is None:
+        return True
+    synced = await get_cache().aget(REPLICA_VERSION_KEY.format(alias))
+    return synced is not None and synced >= version
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+async def _acount(key):
+    cache = get_cache()
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'backend': getattr(settings, 'CACHE_BACKEND', None),
+        'version': get_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Cached bodies may come from a lagging replica; recent writers read the primary
+    if primary_pinned(request):
+        return False
+    # The browsable API renders per-user HTML; only JSON bodies are shared
+    if request.GET.get('format', 'json') != 'json':
+        return False
+    return 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+
+
+def make_key(request, version):
+    query = '&'.join(sorted(f'{k}={v}' for k, values in request.GET.lists() for v in values))
+    digest = hashlib.sha1(f'{request.path}?{query}'.encode('utf-8')).hexdigest()
+    return f'catalog:v{version}:{digest}'
+
+
+def make_etag(content):
+    return '"%s"' % hashlib.md5(content, usedforsecurity=False).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def build_response(request, entry, cache_status):
+    content, content_type, etag = entry
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    response['X-Cache'] = cache_status
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+class CatalogCacheMixin:
+    """
+    Serves the viewset actions named in ``cached_actions`` from the catalog
+    cache. Hits skip DRF entirely, so only use it for public, user-independent
+    responses.
+    """
+    cached_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if action not in self.cached_actions or not is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_cache()
+        version = get_version()
+        key = make_key(request, version)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(HITS_KEY)
+            return build_response(request, entry, 'HIT')
+
+        _count(MISSES_KEY)
+        current = reads_are_current(version)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        response.render()
+        entry = (response.content, response['Content-Type'], make_etag(response.content))
+        if current:
+            cache.set(key, entry, get_timeout())
+        return build_response(request, entry, 'MISS')
+
+
+async def acached_response(request, render):
+    """
+    CatalogCacheMixin for async views: serve ``request`` from the catalog
+    cache, or await ``render()`` and cache its 200 response. ``render`` may
+    return None to leave the request to the caller.
+    """
+    if not is_cacheable_request(request):
+        return await render()
+
+    cache = get_cache()
+    version = await aget_version()
+    key = make_key(request, version)
+    entry = await cache.aget(key)
+    if entry is not None:
+        await _acount(HITS_KEY)
+        return build_response(request, entry, 'HIT')
+
+    await _acount(MISSES_KEY)
+    current = await areads_are_current(version)
+    response = await render()
+    if response is None or response.status_code != 200:
+        return response
+    entry = (response.content, response['Content-Type'], make_etag(response.content))
+    if current:
+        await cache.aset(key, entry, get_timeout())
+    return build_response(request, entry, 'MISS')
@@ -0,0 +1,111 @@
+import threading
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .catalog_cache import aget_version, get_version
+
+# Category.count is the number of in-stock products in the category. It is
+# adjusted with F() updates in the same transaction as the product write
+# (see signals.py); recount_categories rebuilds it after bulk changes.
+
+
+def adjust_count(category_id, delta):
+    from .models import Category
+    if category_id is not None and delta:
+        Category.objects.filter(id=category_id).update(count=F('count') + delta)
+
+
+def apply_count_change(old, new):
+    """
+    Update counts for a product moving from ``old`` to ``new``, each a
+    (category_id, in_stock) pair or None when the product did not/does not exist.
+    """
+    if old == new:
+        return
+    if old is not None and old[1]:
+        adjust_count(old[0], -1)
+    if new is not None and new[1]:
+        adjust_count(new[0], 1)
+
+
+def recount_categories():
+    """Recompute every count from the product table in one UPDATE."""
+    from .models import Category, Product
+    in_stock = (
+        Product.objects.filter(category=OuterRef('pk'), in_stock=True)
+        .order_by().values('category').annotate(total=Count('id')).values('total')
+    )
+    with transaction.atomic():
+        return Category.objects.update(count=Coalesce(Subquery(in_stock), Value(0)))
+
+
+class CategoryNameCache:
+    """
+    In-process (id, lower-cased name) list used to turn ``?category=`` into
+    indexed category_id lookups. It is reloaded when the catalog version
+    moves, which every Category write does (including in other processes
+    sharing the catalog cache), and cleared locally on Category signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = None
+
+    def clear(self):
+        with self._lock:
+            self._version, self._entries = None, None
+
+    def entries(self):
+        from .models import Category
+        version = get_version()
+        entries = self._entries
+        if entries is None or self._version != version:
+            entries = [(pk, name.lower()) for pk, name in Category.objects.order_by('id').values_list('id', 'name')]
+            with self._lock:
+                self._version, self._entries = version, entries
+        return entries
+
+    async def aentries(self):
+        from .models import Category
+        version = await aget_version()
+        entries = self._entries
+        if entries is None or self._version != version:
+            entries = [(pk, name.lower()) async for pk, name in Category.objects.order_by('id').values_list('id', 'name')]
+            with self._lock:
+                self._version, self._entries = version, entries
+        return entries
+
+    def resolve(self, term):
+        """
+        Ids of categories named ``term``, case-insensitively; failing that,
+        of categories whose name contains it.
+        """
+        return self._match(self.entries(), term)
+
+    async def aresolve(self, term):
+        return self._match(await self.aentries(), term)
+
+    @staticmethod
+    def _match(entries, term):
+        term = term.strip().lower()
+        exact = [pk for pk, name in entries if name == term]
+        return exact or [pk for pk, name in entries if term in name]
+
+
+category_names = CategoryNameCache()
+
+
+def category_filter(term):
+    """Q for products in the categories ``term`` resolves to."""
+    return _ids_filter(category_names.resolve(term))
+
+
+async def acategory_filter(term):
+    return _ids_filter(await category_names.aresolve(term))
+
+
+def _ids_filter(ids):
+    if len(ids) == 1:
+        return Q(category_id=ids[0])
+    return Q(category_id__in=ids)
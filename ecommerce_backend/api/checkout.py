@@ -0,0 +1,50 @@
+import uuid
+from django.db import transaction
+from .carts import invalidate_cart_summary, lock_cart
+from .models import Cart, Order, OrderItem
+from .sales import record_order_sales
+
+
+def generate_order_number():
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+
+def checkout_cart(user, shipping_address='', payment_method='credit_card'):
+    """
+    Turn the user's cart into an order atomically, in a fixed number of
+    queries: lock, one joined read of lines and prices, order insert, one
+    bulk insert of items and one DELETE of the cart. Returns None if the cart
+    is empty.
+    """
+    with transaction.atomic():
+        lines = list(
+            lock_cart(user)
+            .select_related('product')
+            .only('id', 'quantity', 'product', 'product__price', 'product__category')
+        )
+        if not lines:
+            return None
+
+        total_amount = sum(line.product.price * line.quantity for line in lines)
+        order = Order.objects.create(
+            user=user,
+            order_number=generate_order_number(),
+            total_amount=total_amount,
+            shipping_address=shipping_address,
+            payment_method=payment_method
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=line.product_id,
+                quantity=line.quantity,
+                price=line.product.price
+            )
+            for line in lines
+        ])
+        Cart.objects.filter(id__in=[line.id for line in lines]).delete()
+        record_order_sales(order, [
+            (line.product_id, line.product.category_id, line.quantity, line.product.price) for line in lines
+        ])
+        invalidate_cart_summary(user.pk)
+    return order
@@ -0,0 +1,154 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Q
+
+# Inverted facet index: one ProductFacet row per (facet, value, product).
+# Filtering on a facet value reads one posting list off the unique
+# (facet, value, product) index, and counting a facet is a GROUP BY over the
+# postings of the products left by the other filters, so neither touches the
+# JSON columns. Rows are kept in sync on product save (see signals.py).
+
+FACETS = ('category', 'color', 'size', 'price')
+
+# Price buckets as (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('0-25', Decimal('0'), Decimal('25')),
+    ('25-50', Decimal('25'), Decimal('50')),
+    ('50-100', Decimal('50'), Decimal('100')),
+    ('100-250', Decimal('100'), Decimal('250')),
+    ('250+', Decimal('250'), None),
+)
+PRICE_BUCKET_ORDER = {label: index for index, (label, _, _) in enumerate(PRICE_BUCKETS)}
+
+FACET_SOURCE_FIELDS = {'category', 'category_id', 'price', 'colors', 'sizes'}
+
+
+def price_bucket(price):
+    price = Decimal(price)
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_BUCKETS[0][0]
+
+
+def _list_values(values):
+    if not isinstance(values, list):
+        return []
+    return [str(value).strip() for value in values if str(value).strip()]
+
+
+def facet_values(category_id, price, colors, sizes):
+    """The (facet, value) pairs a product with these attributes is listed under."""
+    pairs = {('category', str(category_id)), ('price', price_bucket(price))}
+    pairs.update(('color', value) for value in _list_values(colors))
+    pairs.update(('size', value) for value in _list_values(sizes))
+    return pairs
+
+
+def sync_product_facets(product):
+    """Diff a saved product's postings against its current attributes."""
+    from .models import ProductFacet
+    wanted = facet_values(product.category_id, product.price, product.colors, product.sizes)
+    with transaction.atomic():
+        existing = {
+            (facet, value): pk
+            for pk, facet, value in ProductFacet.objects.filter(product=product).values_list('id', 'facet', 'value')
+        }
+        stale = [pk for pair, pk in existing.items() if pair not in wanted]
+        if stale:
+            ProductFacet.objects.filter(id__in=stale).delete()
+        missing = wanted - existing.keys()
+        if missing:
+            ProductFacet.objects.bulk_create(
+                ProductFacet(product=product, facet=facet, value=value) for facet, value in missing
+            )
+
+
+def rebuild_facet_index(product_model=None, facet_model=None, batch_size=5000):
+    """Rebuild every posting from the product table; returns rows written."""
+    if product_model is None or facet_model is None:
+        from .models import Product, ProductFacet
+        product_model, facet_model = product_model or Product, facet_model or ProductFacet
+
+    written = 0
+    with transaction.atomic():
+        facet_model.objects.all().delete()
+        batch = []
+        rows = product_model.objects.order_by('id').values_list(
+            'id', 'category_id', 'price', 'colors', 'sizes'
+        ).iterator(chunk_size=batch_size)
+        for product_id, category_id, price, colors, sizes in rows:
+            batch.extend(
+                facet_model(product_id=product_id, facet=facet, value=value)
+                for facet, value in facet_values(category_id, price, colors, sizes)
+            )
+            if len(batch) >= batch_size:
+                facet_model.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            facet_model.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def parse_facet_param(params, name):
+    """Selected values for a facet: ``?color=Red&color=Blue`` or ``?color=Red,Blue``."""
+    values = []
+    for raw in params.getlist(name):
+        values.extend(value.strip() for value in raw.split(',') if value.strip())
+    return values
+
+
+def facet_filter(facet, values):
+    """Products listed under any of ``values`` for ``facet``."""
+    from .models import ProductFacet
+    postings = ProductFacet.objects.filter(facet=facet, value__in=values).values('product_id')
+    return Q(id__in=postings)
+
+
+def facet_count_queryset(facet, product_ids=None):
+    """(value, count) rows for one facet, grouped straight off the postings index."""
+    from .models import ProductFacet
+    postings = ProductFacet.objects.filter(facet=facet)
+    if product_ids is not None:
+        postings = postings.filter(product_id__in=product_ids)
+    return postings.order_by().values_list('value').annotate(count=Count('id'))
+
+
+def facet_counts(facet, product_ids=None):
+    """
+    [{'value': ..., 'count': n}] for one facet, restricted to the products in
+    ``product_ids`` (a values('id') queryset) when given.
+    """
+    from .models import Category
+    counts = list(facet_count_queryset(facet, product_ids))
+    names = None
+    if facet == 'category':
+        names = dict(Category.objects.filter(id__in=[int(value) for value, _ in counts]).values_list('id', 'name'))
+    return _format_counts(facet, counts, names)
+
+
+async def afacet_counts(facet, product_ids=None):
+    """facet_counts() through the async ORM."""
+    from .models import Category
+    counts = [row async for row in facet_count_queryset(facet, product_ids)]
+    names = None
+    if facet == 'category':
+        names = {
+            pk: name async for pk, name in
+            Category.objects.filter(id__in=[int(value) for value, _ in counts]).values_list('id', 'name')
+        }
+    return _format_counts(facet, counts, names)
+
+
+def _format_counts(facet, counts, category_names=None):
+    if facet == 'category':
+        # Postings hold category ids; clients filter by name
+        counts = [(category_names[int(value)], count) for value, count in counts if int(value) in category_names]
+
+    if facet == 'price':
+        counts.sort(key=lambda item: PRICE_BUCKET_ORDER.get(item[0], len(PRICE_BUCKET_ORDER)))
+    else:
+        counts.sort(key=lambda item: (-item[1], item[0]))
+    return [{'value': value, 'count': count} for value, count in counts]
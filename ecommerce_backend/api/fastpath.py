@@ -0,0 +1,179 @@
+import json
+from decimal import Decimal, getcontext
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt; the stdlib encoder still works
+    orjson = None
+
+# Opt-in fast path for hot list endpoints. A DRF serializer class is compiled
+# once into a flat column list for values_list() plus one mapper per output
+# key, so rendering a row is a dict comprehension over a tuple instead of
+# DRF's per-field get_attribute/to_representation machinery. Output is
+# byte-for-byte what the serializer + JSONRenderer produce.
+
+
+def is_enabled(request):
+    if not getattr(settings, 'FAST_LIST_SERIALIZATION', False):
+        return False
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format == 'json'
+
+
+def _decimal_mapper(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = Decimal(1).scaleb(-field.decimal_places)
+    context = getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def to_string(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=field.rounding, context=context))
+    return to_string
+
+
+def _datetime_mapper(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if not settings.USE_TZ or hasattr(field, 'timezone') or output_format is None \
+            or output_format.lower() != 'iso-8601':
+        return field.to_representation
+
+    def to_iso(value):
+        if not value:
+            return None
+        value = value.astimezone(timezone.get_current_timezone()).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return to_iso
+
+
+def _identity(value):
+    return value
+
+
+def _mapper_for(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_mapper(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_mapper(field)
+    if isinstance(field, serializers.JSONField) and field.binary:
+        return field.to_representation
+    if isinstance(field, (serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+                          serializers.JSONField, serializers.ReadOnlyField, serializers.ModelField)):
+        # Values arrive from the database already as int/str/bool/decoded JSON
+        return _identity
+    return field.to_representation
+
+
+class FastRows:
+    """
+    Compiled row renderer for a (possibly nested) ModelSerializer.
+
+    ``computed`` maps output keys the serializer can't express as columns
+    (properties, SerializerMethodFields) to ``(source_columns, function)``;
+    the function receives the source values positionally. ``extra_columns``
+    are fetched but not rendered, e.g. for keyset cursors.
+    """
+
+    def __init__(self, serializer_class, computed=None, extra_columns=()):
+        self.serializer_class = serializer_class
+        self.columns = []
+        self.getters = self._compile(serializer_class(), '', computed or {})
+        for column in extra_columns:
+            self._column(column)
+        self.columns = tuple(self.columns)
+
+    def _column(self, name):
+        if name not in self.columns:
+            self.columns.append(name)
+        return self.columns.index(name)
+
+    def _compile(self, serializer, prefix, computed):
+        getters = []
+        for key, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if f'{prefix}{key}' in computed:
+                sources, function = computed[f'{prefix}{key}']
+                indexes = [self._column(source) for source in sources]
+                getters.append((key, self._computed_getter(indexes, function)))
+            elif isinstance(field, serializers.BaseSerializer):
+                if getattr(field, 'many', False):
+                    raise ValueError(f'{key}: to-many nested serializers are not supported')
+                nested_prefix = f'{prefix}{field.source}__'
+                nested = self._compile(field, nested_prefix, computed)
+                pk_index = self._column(f'{nested_prefix}{field.Meta.model._meta.pk.attname}')
+                getters.append((key, self._nested_getter(pk_index, nested)))
+            elif isinstance(field, (serializers.SerializerMethodField, serializers.HiddenField)):
+                raise ValueError(f'{key}: provide a computed mapping for {type(field).__name__}')
+            else:
+                index = self._column(f'{prefix}{field.source}')
+                getters.append((key, self._column_getter(index, _mapper_for(field))))
+        return tuple(getters)
+
+    # Getters take (row, memo); memo lives for one render() call so nested
+    # objects shared by many rows (e.g. a product's category) render once.
+
+    @staticmethod
+    def _column_getter(index, mapper):
+        if mapper is _identity:
+            return lambda row, memo: row[index]
+
+        def get(row, memo):
+            value = row[index]
+            return None if value is None else mapper(value)
+        return get
+
+    @staticmethod
+    def _computed_getter(indexes, function):
+        return lambda row, memo: function(*[row[index] for index in indexes])
+
+    @staticmethod
+    def _nested_getter(pk_index, getters):
+        def get(row, memo):
+            pk = row[pk_index]
+            # A null foreign key renders as null, like the nested serializer
+            if pk is None:
+                return None
+            key = (id(getters), pk)
+            if key not in memo:
+                memo[key] = {name: getter(row, memo) for name, getter in getters}
+            return memo[key]
+        return get
+
+    def values(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def render(self, rows):
+        getters = self.getters
+        memo = {}
+        return [{key: get(row, memo) for key, get in getters} for row in rows]
+
+
+def dumps(data):
+    """JSON bytes identical to DRF's compact JSONRenderer, via orjson when installed."""
+    if orjson is not None:
+        # Non-str keys (e.g. rating_histogram's stars) become strings, as in json
+        content = orjson.dumps(data, default=encoders.JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        content = json.dumps(
+            data, cls=encoders.JSONEncoder, ensure_ascii=False,
+            allow_nan=False, separators=(',', ':')
+        ).encode('utf-8')
+    # JSONRenderer escapes these so the output is also valid JavaScript
+    return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http.request import RawPostDataException
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+# Views decorated with @idempotent run once per (user, Idempotency-Key
+# header). The first request claims the key by inserting a pending row and
+# then stores its response there, in the transaction that makes the view's
+# writes, so a crash can never leave the writes without the response; a retry within IDEMPOTENCY_KEY_TTL is
+# answered from that row, found through the unique (user, key) index. A
+# retry arriving while the first request is still running waits for it,
+# on an Event in the same process or by re-reading the row from another,
+# rather than running the view a second time.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def lock_timeout():
+    # How long a duplicate waits for the first request, and after which an
+    # unfinished claim (its process died) is given up
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 30)
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    try:
+        digest.update(request.body)
+    except RawPostDataException:
+        # Multipart bodies are streamed; fall back to the parsed data
+        digest.update(repr(sorted(request.data.items())).encode())
+    return digest.hexdigest()
+
+
+def purge_expired_keys():
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - key_ttl()).delete()[0]
+
+
+def claim(user, key, request_hash):
+    """(record, claimed): a new pending row for this request, or the existing one."""
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, request_hash=request_hash), True
+        except IntegrityError:
+            pass
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            continue
+        now = timezone.now()
+        expired = record.created_at < now - key_ttl()
+        abandoned = record.status_code is None and record.created_at < now - timedelta(seconds=lock_timeout())
+        if not (expired or abandoned):
+            return record, False
+        IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+    return record, False
+
+
+def wait_for(record):
+    """Re-read ``record`` until its request finishes or the lock timeout passes."""
+    deadline = time.monotonic() + lock_timeout()
+    event = _in_flight.get((record.user_id, record.key))
+    delay = 0.02
+    while True:
+        remaining = deadline - time.monotonic()
+        if event is not None:
+            event.wait(max(remaining, 0))
+        else:
+            time.sleep(max(min(delay, remaining), 0))
+            delay = min(delay * 2, 0.5)
+        current = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if current is None or current.status_code is not None or time.monotonic() >= deadline:
+            return current
+        event = None
+
+
+def execute(record, view, *args, **kwargs):
+    token = (record.user_id, record.key)
+    event = threading.Event()
+    with _in_flight_lock:
+        _in_flight[token] = event
+    try:
+        try:
+            with transaction.atomic():
+                response = view(*args, **kwargs)
+                if response.status_code >= 500:
+                    transaction.set_rollback(True)
+                else:
+                    # In the view's transaction, so its writes never commit
+                    # without the response that marks the key complete
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status_code=response.status_code,
+                        # As DRF renders it, so replays match byte for byte
+                        response=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                    )
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            # Rolled back above; let a retry run it again
+            record.delete()
+        return response
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(token, None)
+        event.set()
+
+
+def idempotent(method):
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_hash = request_fingerprint(request)
+        record, claimed = claim(request.user, key, request_hash)
+        if claimed:
+            return execute(record, method, self, request, *args, **kwargs)
+        if record is not None and record.request_hash != request_hash:
+            return Response(
+                {'error': f'{HEADER} was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record is not None and record.status_code is None:
+            record = wait_for(record)
+        if record is None or record.status_code is None:
+            # Still running, or it failed and released the key: retry later
+            return Response(
+                {'error': f'A request with this {HEADER} is in progress, please retry'},
+                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'}
+            )
+        return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+    return wrapper
@@ -0,0 +1,348 @@
+import itertools
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from bisect import bisect
+from decimal import Decimal
+from functools import partial
+from django.db import connections, transaction
+
+# Seeded synthetic catalog for load testing. Rows are generated in fixed-size
+# shards, each with its own RNG derived from (seed, table, shard), so the
+# data set is identical whatever the number of worker processes. Workers
+# only build plain tuples; the parent process inserts them in shard order
+# with bulk_create, which keeps ids deterministic and works with SQLite's
+# single writer.
+
+SHARD_SIZE = 5000
+
+COLORS = ['Black', 'White', 'Navy', 'Grey', 'Red', 'Blue', 'Green', 'Beige', 'Brown', 'Pink', 'Yellow', 'Olive']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+FEATURES = [
+    'Machine washable', 'Organic cotton', 'Water resistant', 'Slim fit', 'Regular fit',
+    'Breathable', 'Recycled materials', 'Stretch fabric', 'Lightweight', 'Padded',
+]
+CATEGORY_WORDS = ['Outdoor', 'Studio', 'Basics', 'Active', 'Formal', 'Kids', 'Home', 'Travel']
+CATEGORY_NOUNS = ['Wear', 'Shoes', 'Accessories', 'Bags', 'Knitwear', 'Denim']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Khan', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Ahmed', 'Berg', 'Rossi']
+REVIEW_OPENERS = ['Great', 'Decent', 'Disappointing', 'Excellent', 'Okay', 'Lovely', 'Poor', 'Solid']
+REVIEW_SUBJECTS = ['quality', 'fit', 'fabric', 'value for money', 'colour', 'stitching', 'delivery']
+# Ratings skew positive, as they do on real storefronts
+RATING_WEIGHTS = [4, 5, 12, 34, 45]
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
+ORDER_STATUS_WEIGHTS = [5, 5, 15, 70, 5]
+PAYMENT_METHODS = ['credit_card', 'paypal', 'bank_transfer', 'cash_on_delivery']
+PAYMENT_WEIGHTS = [60, 25, 10, 5]
+
+# Per-process caches of Zipf tables and vocabularies
+_zipf_tables = {}
+_vocabularies = {}
+
+
+def shard_rng(seed, table, shard):
+    return random.Random(f'{seed}:{table}:{shard}')
+
+
+class Zipf:
+    """
+    Samples ranks 0..n-1 with P(rank k) proportional to 1 / (k + 1) ** s.
+    Ranks are spread over the index range with a fixed permutation, so the
+    most popular items are not simply the first ones inserted.
+    """
+
+    def __init__(self, n, s=1.0):
+        self.n = n
+        self.cumulative = list(itertools.accumulate(1 / (k + 1) ** s for k in range(n)))
+        self.total = self.cumulative[-1]
+        self.stride = 2654435761
+        while math.gcd(self.stride, n) != 1:
+            self.stride += 1
+
+    @classmethod
+    def cached(cls, n, s=1.0):
+        key = (n, s)
+        if key not in _zipf_tables:
+            _zipf_tables[key] = cls(n, s)
+        return _zipf_tables[key]
+
+    def sample(self, rng):
+        rank = min(bisect(self.cumulative, rng.random() * self.total), self.n - 1)
+        return (rank * self.stride) % self.n
+
+    def sample_distinct(self, rng, k):
+        k = min(k, self.n)
+        chosen = []
+        seen = set()
+        while len(chosen) < k:
+            index = self.sample(rng)
+            if index not in seen:
+                seen.add(index)
+                chosen.append(index)
+        return chosen
+
+
+def skewed_count(rng, mean, cap):
+    """Per-user item counts: many users with none or few, a long tail with many."""
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean) + 0.5), cap)
+
+
+def generate_categories(seed, count):
+    rng = shard_rng(seed, 'categories', 0)
+    return [
+        (f'{rng.choice(CATEGORY_WORDS)} {rng.choice(CATEGORY_NOUNS)} {index + 1}',
+         f'https://picsum.photos/seed/category{index}/300/200')
+        for index in range(count)
+    ]
+
+
+def vocabulary(seed, size):
+    from .bench import make_vocabulary
+    key = (seed, size)
+    if key not in _vocabularies:
+        words, weights = make_vocabulary(random.Random(f'{seed}:vocabulary'), size=size)
+        _vocabularies[key] = (words, list(itertools.accumulate(weights)))
+    return _vocabularies[key]
+
+
+def generate_products(seed, prefix, categories, vocabulary_size, shard, start, stop):
+    from .bench import WORDS
+    rng = shard_rng(seed, 'products', shard)
+    words, cumulative = vocabulary(seed, vocabulary_size)
+    # Long-tail categories: a few large ones hold most of the catalog
+    category_zipf = Zipf.cached(categories, 1.2)
+    rows = []
+    for index in range(start, stop):
+        tail = rng.choices(words, cum_weights=cumulative, k=8)
+        name = ' '.join([rng.choice(WORDS), rng.choice(WORDS)] + tail[:2]).title()
+        description = ' '.join([rng.choice(WORDS) for _ in range(14)] + tail[2:]).capitalize() + '.'
+        price = min(max(int(math.exp(rng.gauss(3.4, 0.8)) * 100), 199), 250000)
+        discount = rng.choice([0, 0, 0, 10, 15, 20, 25, 30, 50])
+        original = price * 100 // (100 - discount) if discount else None
+        rows.append((
+            name[:200], description, price, original, discount,
+            f'{prefix}-{index:08d}'.upper(), category_zipf.sample(rng), rng.random() > 0.08,
+            rng.sample(COLORS, rng.randint(1, 4)), rng.sample(SIZES, rng.randint(1, 5)),
+            rng.sample(FEATURES, 3), [f'https://picsum.photos/seed/{prefix}{index}/400/400'],
+        ))
+    return rows
+
+
+def generate_users(seed, prefix, shard, start, stop):
+    rng = shard_rng(seed, 'users', shard)
+    rows = []
+    for index in range(start, stop):
+        username = f'{prefix}-user-{index}'
+        rows.append((username, f'{username}@example.com', rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)))
+    return rows
+
+
+def generate_user_items(seed, table, products, mean, cap, shard, start, stop):
+    """(user_index, product_index, extra) rows; products are distinct per user."""
+    rng = shard_rng(seed, table, shard)
+    popularity = Zipf.cached(products, 1.0)
+    rows = []
+    for user_index in range(start, stop):
+        for product_index in popularity.sample_distinct(rng, skewed_count(rng, mean, cap)):
+            if table == 'reviews':
+                rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+                comment = f'{rng.choice(REVIEW_OPENERS)} {rng.choice(REVIEW_SUBJECTS)}.'
+                rows.append((user_index, product_index, (rating, comment)))
+            elif table == 'carts':
+                rows.append((user_index, product_index, rng.choices([1, 1, 1, 2, 2, 3])[0]))
+            else:
+                rows.append((user_index, product_index, None))
+    return rows
+
+
+def generate_orders(seed, prefix, users, products, shard, start, stop):
+    rng = shard_rng(seed, 'orders', shard)
+    # Repeat buyers: a small share of users places most orders
+    buyers = Zipf.cached(users, 0.8)
+    popularity = Zipf.cached(products, 1.0)
+    rows = []
+    for index in range(start, stop):
+        lines = [
+            (product_index, rng.choices([1, 1, 1, 2, 3])[0])
+            for product_index in popularity.sample_distinct(rng, rng.choices([1, 2, 3, 4, 6], [40, 25, 15, 12, 8])[0])
+        ]
+        rows.append((
+            f'{prefix}-{index:08d}'.upper()[:20], buyers.sample(rng),
+            rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+            rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0],
+            f'{rng.randint(1, 999)} {rng.choice(LAST_NAMES)} Street, Springfield', lines,
+        ))
+    return rows
+
+
+def _call_shard(task):
+    function, shard, start, stop = task
+    return function(shard, start, stop)
+
+
+class LoadDataGenerator:
+    """
+    Builds the data set table by table and records (rows, seconds) for each
+    in ``stats``. ``progress`` is called with (table, rows so far, fraction done)
+    after every shard.
+    """
+
+    def __init__(self, seed=42, prefix='load', batch_size=2000, workers=1, using='default',
+                 vocabulary_size=5000, progress=None):
+        self.seed = seed
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.workers = workers
+        self.using = using
+        self.vocabulary_size = vocabulary_size
+        self.progress = progress or (lambda table, rows, fraction: None)
+        self.stats = {}
+        self.pool = None
+
+    def shards(self, function, total):
+        tasks = [
+            (function, shard, start, min(start + SHARD_SIZE, total))
+            for shard, start in enumerate(range(0, total, SHARD_SIZE))
+        ]
+        if self.pool is None:
+            return map(_call_shard, tasks)
+        # imap keeps shard order, so inserts (and ids) do not depend on timing
+        return self.pool.imap(_call_shard, tasks)
+
+    def insert(self, table, function, total, build):
+        """
+        Generate ``total`` units (rows, or users for per-user tables) shard by
+        shard and insert each shard in one transaction.
+        """
+        started = time.perf_counter()
+        done = 0
+        for shard_stop, rows in zip(range(SHARD_SIZE, total + SHARD_SIZE, SHARD_SIZE), self.shards(function, total)):
+            with transaction.atomic(using=self.using):
+                objects = build(rows)
+                if objects:
+                    type(objects[0]).objects.using(self.using).bulk_create(objects, batch_size=self.batch_size)
+            self.after_insert(table, rows, objects)
+            done += len(rows)
+            self.progress(table, done, min(shard_stop, total) / total)
+        self.stats[table] = (done, time.perf_counter() - started)
+        return done
+
+    def after_insert(self, table, rows, objects):
+        if table == 'products':
+            self.product_ids.extend(obj.pk for obj in objects)
+            self.product_prices.extend(row[2] for row in rows)
+        elif table == 'users':
+            self.user_ids.extend(obj.pk for obj in objects)
+
+    def timed(self, name, function):
+        started = time.perf_counter()
+        result = function()
+        self.stats[name] = (result, time.perf_counter() - started)
+        return result
+
+    def run(self, categories=60, products=100000, users=10000, reviews=200000, carts=20000,
+            wishlists=20000, orders=50000):
+        from django.contrib.auth.hashers import make_password
+        from django.contrib.auth.models import User
+        from .catalog_cache import bump_version
+        from .categories import recount_categories
+        from .facets import rebuild_facet_index
+        from .models import Cart, Category, Order, OrderItem, Product, Review, Wishlist
+        from .ratings import recompute_all_ratings
+        from .sales import backfill_sales_rollups
+
+        self.product_ids, self.product_prices, self.user_ids = array('q'), array('q'), array('q')
+        seed, prefix = self.seed, self.prefix
+
+        if self.workers > 1:
+            # Workers never touch the database; close connections so forked
+            # children do not inherit open handles
+            connections.close_all()
+            self.pool = multiprocessing.get_context('fork').Pool(self.workers)
+        try:
+            started = time.perf_counter()
+            category_rows = generate_categories(seed, categories)
+            category_objects = Category.objects.using(self.using).bulk_create(
+                [Category(name=name, image=image) for name, image in category_rows]
+            )
+            category_ids = [category.pk for category in category_objects]
+            self.stats['categories'] = (len(category_ids), time.perf_counter() - started)
+
+            self.insert('products', partial(generate_products, seed, prefix, categories, self.vocabulary_size), products,
+                        lambda rows: [
+                            Product(
+                                name=name, description=description, price=Decimal(price) / 100,
+                                original_price=Decimal(original) / 100 if original else None,
+                                discount=discount, sku=sku, category_id=category_ids[category], in_stock=in_stock,
+                                colors=colors, sizes=sizes, features=features, images=images,
+                            )
+                            for name, description, price, original, discount, sku, category, in_stock,
+                            colors, sizes, features, images in rows
+                        ])
+
+            # One shared hash: hashing per user would dominate the run
+            password = make_password('loadtest')
+            self.insert('users', partial(generate_users, seed, prefix), users,
+                        lambda rows: [
+                            User(username=username, email=email, first_name=first, last_name=last, password=password)
+                            for username, email, first, last in rows
+                        ])
+
+            product_ids, user_ids = self.product_ids, self.user_ids
+            self.insert('reviews', partial(generate_user_items, seed, 'reviews', products, reviews / users, 50),
+                        users, lambda rows: [
+                            Review(user_id=user_ids[user], product_id=product_ids[product], rating=rating, comment=comment)
+                            for user, product, (rating, comment) in rows
+                        ])
+            self.insert('carts', partial(generate_user_items, seed, 'carts', products, carts / users, 20),
+                        users, lambda rows: [
+                            Cart(user_id=user_ids[user], product_id=product_ids[product], quantity=quantity)
+                            for user, product, quantity in rows
+                        ])
+            self.insert('wishlists', partial(generate_user_items, seed, 'wishlists', products, wishlists / users, 40),
+                        users, lambda rows: [
+                            Wishlist(user_id=user_ids[user], product_id=product_ids[product])
+                            for user, product, _ in rows
+                        ])
+
+            prices = self.product_prices
+            item_count = 0
+
+            def build_orders(rows):
+                nonlocal item_count
+                orders_batch = [
+                    Order(
+                        order_number=number, user_id=user_ids[user], status=status, payment_method=payment,
+                        shipping_address=address,
+                        total_amount=Decimal(sum(prices[product] * quantity for product, quantity in lines)) / 100,
+                    )
+                    for number, user, status, payment, address, lines in rows
+                ]
+                Order.objects.using(self.using).bulk_create(orders_batch, batch_size=self.batch_size)
+                items = [
+                    OrderItem(order_id=order.pk, product_id=product_ids[product], quantity=quantity,
+                              price=Decimal(prices[product]) / 100)
+                    for order, row in zip(orders_batch, rows) for product, quantity in row[5]
+                ]
+                item_count += len(items)
+                return items
+
+            self.insert('orders', partial(generate_orders, seed, prefix, users, products), orders, build_orders)
+            self.stats['order items'] = (item_count, self.stats['orders'][1])
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+        # Derived data that signals would maintain for single writes
+        self.timed('ratings', recompute_all_ratings)
+        self.timed('facets', rebuild_facet_index)
+        self.timed('category counts', recount_categories)
+        self.timed('sales rollups', backfill_sales_rollups)
+        bump_version()
+        return self.stats
@@ -0,0 +1,578 @@
+import asyncio
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+# Asyncio load driver for the load_test command. Virtual users replay a
+# shopper journey (login, browse, search, product detail, wishlist toggle,
+# add to cart, checkout) either against the ASGI application in-process or
+# against a running server over HTTP/1.1 keep-alive connections, and every
+# request's latency is recorded under its endpoint name. run_mixed drives
+# steady read/write traffic instead, for the database benchmarks.
+
+API = '/api'
+SORTS = (None, 'price_low', 'price_high', 'rating', 'newest')
+SHIPPING_ADDRESS = '1 Load Test Way'
+WORD_RE = re.compile(r'[a-z]{4,}')
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+    def cookies(self):
+        return [value for name, value in self.headers if name == 'set-cookie']
+
+
+class ASGITransport:
+    """Calls an ASGI application directly, one request per call."""
+
+    def __init__(self, app, host='localhost'):
+        self.app = app
+        self.host = host
+
+    async def request(self, method, path, query, headers, body):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', self.host.encode()), (b'content-length', str(len(body)).encode())] + [
+                (name.lower().encode(), value.encode()) for name, value in headers
+            ],
+            'client': ('127.0.0.1', 50000),
+            'server': (self.host, 80),
+        }
+        finished = asyncio.Event()
+        sent_body = False
+        status, response_headers, chunks = None, [], []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Django watches for a disconnect while the view runs; only
+            # hang up once the response is complete
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = [
+                    (name.decode('latin-1').lower(), value.decode('latin-1'))
+                    for name, value in message.get('headers', [])
+                ]
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        finished.set()
+        return Response(status, response_headers, b''.join(chunks))
+
+    async def close(self):
+        pass
+
+
+class WSGITransport:
+    """
+    Calls a WSGI application on ``executor``'s threads, as a threaded WSGI
+    server (e.g. gunicorn --threads) does: the threads, and so their
+    persistent database connections, serve request after request.
+    """
+
+    def __init__(self, app, executor, host='localhost'):
+        self.app = app
+        self.executor = executor
+        self.host = host
+
+    async def request(self, method, path, query, headers, body):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._call, method, path, query, headers, body
+        )
+
+    def _call(self, method, path, query, headers, body):
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_LENGTH': str(len(body)),
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': self.host,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+
+        started = []
+        result = self.app(environ, lambda status, response_headers, exc_info=None: started.append((status, response_headers)))
+        try:
+            content = b''.join(result)
+        finally:
+            # Django sends request_finished here, which closes expired connections
+            if hasattr(result, 'close'):
+                result.close()
+        status, response_headers = started[0]
+        return Response(
+            int(status.split(' ', 1)[0]),
+            [(name.lower(), value) for name, value in response_headers],
+            content,
+        )
+
+    async def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Minimal HTTP/1.1 client holding one keep-alive connection."""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        if url.scheme != 'http':
+            raise ValueError('Only http:// URLs are supported')
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip('/')
+        self.reader = self.writer = None
+
+    async def request(self, method, path, query, headers, body):
+        target = self.prefix + path + (f'?{query}' if query else '')
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {self.host}:{self.port}', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers)
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+        reused = self.writer is not None
+        try:
+            return await self._send(payload)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+        # The server dropped an idle keep-alive connection; retry once
+        return await self._send(payload)
+
+    async def _send(self, payload):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        if not status_line.strip():
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = []
+        while True:
+            line = (await self.reader.readuntil(b'\r\n')).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers.append((name.strip().lower(), value.strip()))
+        fields = dict(headers)
+
+        if fields.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        elif 'content-length' in fields:
+            body = await self.reader.readexactly(int(fields['content-length']))
+        else:
+            body = await self.reader.read()
+            fields['connection'] = 'close'
+
+        if fields.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, headers, body)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+class Session:
+    """
+    A shopper's cookie jar on top of a transport. Unsafe requests carry the
+    CSRF cookie back in ``X-CSRFToken``, as the frontend does.
+    """
+
+    def __init__(self, transport, recorder):
+        self.transport = transport
+        self.recorder = recorder
+        self.cookies = {}
+
+    async def request(self, name, method, path, params=None, data=None, expect=(200,)):
+        headers = [('Accept', 'application/json')]
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers.append(('Content-Type', 'application/json'))
+        if method not in ('GET', 'HEAD') and 'csrftoken' in self.cookies:
+            headers.append(('X-CSRFToken', self.cookies['csrftoken']))
+        if self.cookies:
+            headers.append(('Cookie', '; '.join(f'{key}={value}' for key, value in self.cookies.items())))
+
+        start = time.perf_counter()
+        try:
+            response = await self.transport.request(method, path, urlencode(params or {}), headers, body)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.recorder.record(name, time.perf_counter() - start, 'failed', False)
+            return None
+        self.recorder.record(name, time.perf_counter() - start, response.status, response.status in expect)
+
+        for header in response.cookies():
+            for key, morsel in SimpleCookie(header).items():
+                self.cookies[key] = morsel.value
+        return response if response.status in expect else None
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.enabled = True
+
+    def record(self, name, seconds, status, ok):
+        if not self.enabled:
+            return
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+        statuses = self.statuses.setdefault(name, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, latencies):
+        ordered = sorted(latencies)
+        return {
+            'mean_ms': round(sum(ordered) / len(ordered), 3),
+            'p50_ms': round(percentile(ordered, 0.50), 3),
+            'p90_ms': round(percentile(ordered, 0.90), 3),
+            'p95_ms': round(percentile(ordered, 0.95), 3),
+            'p99_ms': round(percentile(ordered, 0.99), 3),
+            'max_ms': round(ordered[-1], 3),
+        }
+
+    def endpoints(self):
+        report = {}
+        for name in sorted(self.latencies):
+            report[name] = {
+                'requests': len(self.latencies[name]),
+                'errors': self.errors.get(name, 0),
+                'statuses': dict(sorted(self.statuses[name].items())),
+                **self.summary(self.latencies[name]),
+            }
+        return report
+
+
+def search_terms(products):
+    words = set()
+    for product in products:
+        words.update(WORD_RE.findall(product.get('name', '').lower()))
+    return sorted(words)
+
+
+async def shopper_journey(session, rng, username, password):
+    """One visit; returns True if it got as far as a successful checkout."""
+    response = await session.request(
+        'login', 'POST', f'{API}/auth/login/', data={'username': username, 'password': password}
+    )
+    if response is None:
+        return False
+
+    browsed = []
+    for _ in range(rng.randint(1, 3)):
+        params = {'page': rng.randint(1, 5)}
+        sort_by = rng.choice(SORTS)
+        if sort_by:
+            params['sort_by'] = sort_by
+        response = await session.request('products.list', 'GET', f'{API}/products/', params)
+        if response is not None:
+            browsed.extend(response.json().get('results', []))
+
+    terms = search_terms(browsed)
+    if terms:
+        response = await session.request(
+            'products.search', 'GET', f'{API}/products/', {'search': rng.choice(terms)}
+        )
+        if response is not None:
+            browsed.extend(response.json().get('results', []))
+    if not browsed:
+        return False
+
+    product_ids = sorted({product['id'] for product in browsed})
+    for product_id in rng.sample(product_ids, min(len(product_ids), 2)):
+        await session.request('products.detail', 'GET', f'{API}/products/{product_id}/')
+
+    await session.request(
+        'wishlist.toggle', 'POST', f'{API}/wishlist/toggle/',
+        data={'product_id': rng.choice(product_ids)}, expect=(200, 201),
+    )
+    for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 3))):
+        await session.request(
+            'cart.add', 'POST', f'{API}/cart/',
+            data={'product': product_id, 'quantity': rng.randint(1, 2)}, expect=(200, 201),
+        )
+
+    response = await session.request(
+        'orders.create_from_cart', 'POST', f'{API}/orders/create_from_cart/',
+        data={'shipping_address': SHIPPING_ADDRESS}, expect=(201,),
+    )
+    return response is not None
+
+
+async def run_load(make_transport, usernames, password, concurrency=10, journeys=100,
+                   duration=None, warmup=0, think_time=0.0, seed=42):
+    """
+    Run ``journeys`` visits (or as many as fit in ``duration`` seconds) with
+    ``concurrency`` virtual users and return the JSON-ready report. Virtual
+    user ``k`` logs in as accounts ``k``, ``k + concurrency``, ... so no two
+    concurrent journeys share a cart.
+    """
+    recorder = Recorder()
+    counts = {'started': 0, 'completed': 0, 'failed': 0}
+    deadline = None
+
+    def next_journey():
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        if counts['started'] >= journeys:
+            return False
+        counts['started'] += 1
+        return True
+
+    async def virtual_user(index, measured):
+        rng = random.Random(seed * 1000003 + index)
+        transport = make_transport()
+        account = index
+        try:
+            while next_journey() if measured else account < warmup:
+                session = Session(transport, recorder)
+                ok = await shopper_journey(session, rng, usernames[account % len(usernames)], password)
+                if measured:
+                    counts['completed' if ok else 'failed'] += 1
+                account += concurrency
+                if think_time:
+                    await asyncio.sleep(rng.uniform(0, 2 * think_time))
+        finally:
+            await transport.close()
+
+    if warmup:
+        recorder.enabled = False
+        await asyncio.gather(*(virtual_user(index, False) for index in range(min(concurrency, warmup))))
+        recorder.enabled = True
+
+    start = time.perf_counter()
+    if duration is not None:
+        deadline = start + duration
+    await asyncio.gather(*(virtual_user(index, True) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    endpoints = recorder.endpoints()
+    requests = sum(stats['requests'] for stats in endpoints.values())
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'journeys': counts['completed'] + counts['failed'],
+        'journeys_failed': counts['failed'],
+        'journeys_per_second': round((counts['completed'] + counts['failed']) / elapsed, 2) if elapsed else None,
+        'requests': requests,
+        'errors': sum(stats['errors'] for stats in endpoints.values()),
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+        'endpoints': endpoints,
+    }
+
+
+MIXED_READS = ('products.list', 'products.detail', 'products.search', 'categories.list', 'cart.list', 'orders.list')
+MIXED_WRITES = ('cart.add', 'wishlist.toggle', 'orders.create_from_cart')
+
+
+async def mixed_read(session, rng, product_ids, terms):
+    name = rng.choice(MIXED_READS)
+    if name == 'products.list':
+        params = {'page': rng.randint(1, 20)}
+        sort_by = rng.choice(SORTS)
+        if sort_by:
+            params['sort_by'] = sort_by
+        await session.request(name, 'GET', f'{API}/products/', params)
+    elif name == 'products.detail':
+        await session.request(name, 'GET', f'{API}/products/{rng.choice(product_ids)}/')
+    elif name == 'products.search':
+        await session.request(name, 'GET', f'{API}/products/', {'search': rng.choice(terms)})
+    elif name == 'categories.list':
+        await session.request(name, 'GET', f'{API}/categories/')
+    elif name == 'cart.list':
+        await session.request(name, 'GET', f'{API}/cart/')
+    else:
+        await session.request(name, 'GET', f'{API}/orders/')
+
+
+async def mixed_write(session, rng, product_ids):
+    name = rng.choices(MIXED_WRITES, (6, 3, 1))[0]
+    if name == 'cart.add':
+        await session.request(
+            name, 'POST', f'{API}/cart/',
+            data={'product': rng.choice(product_ids), 'quantity': rng.randint(1, 2)}, expect=(200, 201),
+        )
+    elif name == 'wishlist.toggle':
+        await session.request(
+            name, 'POST', f'{API}/wishlist/toggle/', data={'product_id': rng.choice(product_ids)}, expect=(200, 201),
+        )
+    else:
+        # 400 when the cart is still empty
+        await session.request(
+            name, 'POST', f'{API}/orders/create_from_cart/',
+            data={'shipping_address': SHIPPING_ADDRESS}, expect=(201, 400),
+        )
+
+
+async def run_mixed(make_transport, usernames, password, product_ids, terms, concurrency=16,
+                    duration=10.0, write_ratio=0.2, seed=42):
+    """
+    Catalog, cart and order reads mixed with cart, wishlist and checkout
+    writes for ``duration`` seconds. Each of ``concurrency`` virtual users
+    logs in once, unmeasured, then sends requests back to back, each a write
+    with probability ``write_ratio``. Reports reads and writes separately.
+    """
+    recorder = Recorder()
+    recorder.enabled = False
+    sessions = [Session(make_transport(), recorder) for _ in range(concurrency)]
+    logins = await asyncio.gather(*(
+        session.request('login', 'POST', f'{API}/auth/login/', data={'username': usernames[index % len(usernames)], 'password': password})
+        for index, session in enumerate(sessions)
+    ))
+    if None in logins:
+        raise RuntimeError('Virtual users could not log in')
+    recorder.enabled = True
+
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(index, session):
+        rng = random.Random(seed * 1000003 + index)
+        try:
+            while time.perf_counter() < deadline:
+                if rng.random() < write_ratio:
+                    await mixed_write(session, rng, product_ids)
+                else:
+                    await mixed_read(session, rng, product_ids, terms)
+        finally:
+            await session.transport.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(virtual_user(index, session) for index, session in enumerate(sessions)))
+    elapsed = time.perf_counter() - start
+
+    def totals(names):
+        latencies = [latency for name in names for latency in recorder.latencies.get(name, [])]
+        return {
+            'requests': len(latencies),
+            'errors': sum(recorder.errors.get(name, 0) for name in names),
+            'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+            **(recorder.summary(latencies) if latencies else {}),
+        }
+
+    endpoints = recorder.endpoints()
+    requests = sum(stats['requests'] for stats in endpoints.values())
+    return {
+        'concurrency': concurrency,
+        'write_ratio': write_ratio,
+        'seconds': round(elapsed, 3),
+        'requests': requests,
+        'errors': sum(stats['errors'] for stats in endpoints.values()),
+        'requests_per_second': round(requests / elapsed, 2) if elapsed else None,
+        'reads': totals(MIXED_READS),
+        'writes': totals(MIXED_WRITES),
+        'endpoints': endpoints,
+    }
+
+
+async def replay_requests(transport, requests, concurrency):
+    """
+    GET every (name, path) in ``requests`` over ``concurrency`` concurrent
+    connections. Reports throughput, latency and the peak number of live
+    threads, i.e. how many workers the requests pinned.
+    """
+    recorder = Recorder()
+    pending = iter(requests)
+    peak_threads = threading.active_count()
+    running = True
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while running:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.002)
+
+    async def connection():
+        for name, url in pending:
+            path, _, query = url.partition('?')
+            start = time.perf_counter()
+            response = await transport.request('GET', path, query, [('Accept', 'application/json')], b'')
+            recorder.record(name, time.perf_counter() - start, response.status, response.status == 200)
+
+    sampler = asyncio.create_task(sample_threads())
+    start = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    running = False
+    await sampler
+
+    latencies = [latency for values in recorder.latencies.values() for latency in values]
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(recorder.errors.values()),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'peak_threads': peak_threads,
+        **(recorder.summary(latencies) if latencies else {}),
+        'endpoints': recorder.endpoints(),
+    }
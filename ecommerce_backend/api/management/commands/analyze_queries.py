@@ -0,0 +1,58 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.query_advisor import DEFAULT_ACCEPTED_SORTS, DEFAULT_ALLOWED_SCANS, FINDING_KINDS, analyze_queries, failures
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind every API filter/sort combination and flag full scans and temp B-tree sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', help='Only analyze queries whose name contains this text')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--allow-scan', action='append', default=None, metavar='TABLE',
+                            help=f"Tables that may be scanned (default: {', '.join(DEFAULT_ALLOWED_SCANS)})")
+        parser.add_argument('--accept-sort', action='append', default=None, metavar='PATTERN',
+                            help='Regex of query names whose temp B-tree sort is accepted (default: the documented '
+                                 'price range, facet and category cursor sorts; pass "^$" to accept none)')
+        parser.add_argument('--ignore', action='append', default=[], metavar='TEXT',
+                            help='Accept findings for queries whose name contains this text')
+        parser.add_argument('--fail-on', action='append', choices=FINDING_KINDS, default=[],
+                            help='Exit with an error if any query has a finding of this kind')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        allowed_scans = options['allow_scan'] if options['allow_scan'] is not None else DEFAULT_ALLOWED_SCANS
+        accepted_sorts = options['accept_sort'] if options['accept_sort'] is not None else DEFAULT_ACCEPTED_SORTS
+        report = analyze_queries(
+            page_size=options['page_size'],
+            allowed_scans=allowed_scans,
+            name_filter=options['only'],
+            accepted_sorts=accepted_sorts,
+        )
+        report = [
+            {**entry, 'findings': []} if any(text in entry['name'] for text in options['ignore']) else entry
+            for entry in report
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for entry in report:
+                if not entry['findings'] and options['verbosity'] < 2:
+                    continue
+                style = self.style.WARNING if entry['findings'] else self.style.SUCCESS
+                self.stdout.write(style(entry['name']))
+                for detail in entry['plan']:
+                    self.stdout.write(f'    {detail}')
+                for finding in entry['findings']:
+                    self.stdout.write(self.style.WARNING(f"    ! {finding['kind']}: {finding['detail']}"))
+
+        flagged = failures(report)
+        summary = f'{len(report)} queries analyzed, {len(flagged)} with findings'
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS(summary) if not flagged else summary)
+
+        if options['fail_on']:
+            failed = failures(report, kinds=options['fail_on'])
+            if failed:
+                names = ', '.join(entry['name'] for entry in failed)
+                raise CommandError(f"{len(failed)} queries with {'/'.join(options['fail_on'])} findings: {names}")
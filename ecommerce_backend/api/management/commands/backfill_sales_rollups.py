@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api.sales import backfill_sales_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from the order tables, streaming orders in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Orders read and written per transaction')
+
+    def handle(self, *args, **options):
+        def progress(done, last_seen, last_id):
+            if self.verbosity > 1:
+                self.stdout.write(f'  {done} orders (up to id {last_seen} of {last_id})')
+
+        self.verbosity = options['verbosity']
+        orders = backfill_sales_rollups(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups from {orders} orders'))
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import random
+import types
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import include, path
+from api.bench import catalog_requests
+from api.catalog_cache import bump_version
+from api.loadtest import ASGITransport, replay_requests
+from api.models import Category, Product
+from api.urls import api_urlpatterns
+
+MODES = ('sync', 'async')
+
+
+def mode_urlconf(mode):
+    # A root URLconf serving /api/ with or without the async catalog views
+    urlconf = types.ModuleType(f'{mode}_catalog_urls')
+    urlconf.urlpatterns = [path('api/', include(api_urlpatterns(async_catalog=mode == 'async')))]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent-connection capacity of the sync and async catalog views under ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 200])
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per concurrency level')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        # Requests run on other threads and connections, so this needs
+        # committed data (e.g. from generate_load_data), not a scratch transaction
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:5000])
+        category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+        if not product_ids:
+            raise CommandError('No products; run generate_load_data first')
+
+        from ecommerce_backend.asgi import application
+        transport = ASGITransport(application)
+        rng = random.Random(options['seed'])
+        workload = catalog_requests(rng, product_ids, category_ids, options['requests'])
+        urlconfs = {mode: mode_urlconf(mode) for mode in MODES}
+
+        paths = sorted(set(path for _, path in workload))
+        mismatches = asyncio.run(self.compare(transport, urlconfs, paths))
+        if mismatches:
+            raise CommandError(f'Async responses differ from the DRF views for: {", ".join(mismatches[:5])}')
+        # Both modes then start from the same warm catalog cache
+        with override_settings(ROOT_URLCONF=urlconfs['sync']):
+            asyncio.run(replay_requests(transport, [('warmup', path) for path in paths], 10))
+
+        report = []
+        for concurrency in options['concurrency']:
+            for mode in MODES:
+                with override_settings(ROOT_URLCONF=urlconfs[mode]):
+                    result = asyncio.run(replay_requests(transport, workload, concurrency))
+                report.append({'mode': mode, **result})
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write('Async responses are byte-identical to the DRF views')
+        self.stdout.write(
+            f"{'mode':<7}{'conns':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'threads':>9}{'errors':>8}"
+        )
+        for row in report:
+            self.stdout.write(
+                f"{row['mode']:<7}{row['concurrency']:>7}{row['requests_per_second']:>10.1f}"
+                f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['peak_threads']:>9}{row['errors']:>8}"
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    async def compare(self, transport, urlconfs, paths):
+        """Paths whose status or body differs between the sync and async views."""
+        mismatches = []
+        for url in paths:
+            path_, _, query = url.partition('?')
+            responses = {}
+            for mode in MODES:
+                # Render in both modes rather than serve the first one's cache entry
+                await sync_to_async(bump_version)()
+                with override_settings(ROOT_URLCONF=urlconfs[mode]):
+                    response = await transport.request('GET', path_, query, [('Accept', 'application/json')], b'')
+                responses[mode] = (response.status, response.body)
+            if responses['sync'] != responses['async']:
+                mismatches.append(url)
+        return mismatches
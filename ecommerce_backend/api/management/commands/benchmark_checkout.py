@@ -0,0 +1,46 @@
+import random
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from api.bench import scratch_transaction, make_categories, make_products, time_call
+from api.models import Cart, Product
+from api.views import OrderViewSet
+
+class Command(BaseCommand):
+    help = 'Measure queries and latency of create_from_cart for growing cart sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 20, 100, 500])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        view = OrderViewSet.as_view({'post': 'create_from_cart'})
+
+        with scratch_transaction():
+            make_products(max(options['sizes']), make_categories(), rng)
+            product_ids = list(Product.objects.values_list('id', flat=True)[:max(options['sizes'])])
+            user = User.objects.create(username='bench-checkout')
+
+            def checkout(size):
+                Cart.objects.bulk_create([
+                    Cart(user=user, product_id=product_id, quantity=rng.randint(1, 3))
+                    for product_id in product_ids[:size]
+                ])
+                request = factory.post('/api/orders/create_from_cart/', {'shipping_address': 'Bench St'}, format='json')
+                force_authenticate(request, user=user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request)
+                assert response.status_code == 201, response.data
+                return len(queries)
+
+            self.stdout.write(f"{'cart lines':>10}{'queries':>9}{'median ms':>11}")
+            for size in options['sizes']:
+                median_ms, _, query_count = time_call(lambda: checkout(size), options['repeat'])
+                self.stdout.write(f'{size:>10}{query_count:>9}{median_ms:>11.2f}')
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
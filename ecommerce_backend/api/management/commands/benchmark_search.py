@@ -0,0 +1,53 @@
+import random
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.bench import scratch_transaction, make_categories, make_products, make_vocabulary, time_call
+from api.models import Product
+from api.search import fts_supported, fts_search, icontains_search
+
+class Command(BaseCommand):
+    help = 'Compare FTS5 product search against the icontains scan on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('terms', nargs='*', help='Search terms (default: a mix of common, long-tail and prefix terms)')
+
+    def handle(self, *args, **options):
+        if not fts_supported(connection):
+            raise CommandError('Full-text search index requires SQLite with FTS5')
+
+        rng = random.Random(options['seed'])
+        page_size = options['page_size']
+        repeat = options['repeat']
+
+        vocabulary = make_vocabulary(rng)
+        words = vocabulary[0]
+        terms = options['terms'] or [
+            'denim', 'summer dress', words[0], words[50], words[1000], words[3000], words[200][:4],
+        ]
+
+        with scratch_transaction():
+            self.stdout.write(f"Generating {options['products']} products (rolled back afterwards)...")
+            make_products(options['products'], make_categories(), rng, vocabulary=vocabulary)
+
+            def icontains_page(term):
+                queryset = icontains_search(Product.objects.all(), term).order_by('id')
+                return queryset.count(), list(queryset.values_list('id', flat=True)[:page_size])
+
+            def fts_page(term):
+                queryset = fts_search(Product.objects.all(), term).order_by('search_rank', 'id')
+                return queryset.count(), [p.id for p in queryset.only('id')[:page_size]]
+
+            self.stdout.write(f"{'term':<24}{'icontains ms':>14}{'fts5 ms':>10}{'speedup':>9}{'hits (ic/fts)':>16}")
+            for term in terms:
+                ic_ms, _, (ic_hits, _) = time_call(lambda: icontains_page(term), repeat)
+                fts_ms, _, (fts_hits, _) = time_call(lambda: fts_page(term), repeat)
+                speedup = ic_ms / fts_ms if fts_ms else float('inf')
+                self.stdout.write(
+                    f'{term:<24}{ic_ms:>14.2f}{fts_ms:>10.2f}{speedup:>8.1f}x{f"{ic_hits}/{fts_hits}":>16}'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
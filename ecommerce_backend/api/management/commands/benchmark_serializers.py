@@ -0,0 +1,62 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from api.bench import scratch_transaction, make_categories, make_products
+from api.fastpath import dumps, orjson
+from api.models import Product
+from api.query_plans import PRODUCT_LIST_PLAN
+from api.serializers import ProductListSerializer, PRODUCT_LIST_ROWS
+
+class Command(BaseCommand):
+    help = 'Compare ProductListSerializer throughput against the fast list serialization path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def best_rate(self, fn, rows, repeat):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return rows / best, result
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderer = JSONRenderer()
+
+        with scratch_transaction():
+            make_products(rows, make_categories(), random.Random(options['seed']))
+            queryset = Product.objects.filter(sku__startswith='BENCH-').order_by('id')
+
+            instances = list(PRODUCT_LIST_PLAN.apply(queryset))
+            tuples = list(PRODUCT_LIST_ROWS.values(queryset))
+
+            results = {
+                'drf serialize': self.best_rate(
+                    lambda: ProductListSerializer(instances, many=True).data, rows, repeat),
+                'fast serialize': self.best_rate(
+                    lambda: PRODUCT_LIST_ROWS.render(tuples), rows, repeat),
+                'drf fetch+render': self.best_rate(
+                    lambda: renderer.render(ProductListSerializer(PRODUCT_LIST_PLAN.apply(queryset), many=True).data),
+                    rows, repeat),
+                'fast fetch+render': self.best_rate(
+                    lambda: dumps(PRODUCT_LIST_ROWS.render(PRODUCT_LIST_ROWS.values(queryset))), rows, repeat),
+            }
+
+            if results['drf fetch+render'][1] != results['fast fetch+render'][1]:
+                raise CommandError('Fast path output differs from ProductListSerializer + JSONRenderer')
+
+        self.stdout.write(f"JSON encoder: {'orjson' if orjson else 'json (stdlib)'}; output is byte-identical")
+        self.stdout.write(f"{'path':<20}{'rows/s':>12}")
+        for name, (rate, _) in results.items():
+            self.stdout.write(f'{name:<20}{rate:>12,.0f}')
+        for stage in ('serialize', 'fetch+render'):
+            speedup = results[f'fast {stage}'][0] / results[f'drf {stage}'][0]
+            self.stdout.write(f'{stage} speedup: {speedup:.1f}x')
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import random
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from api.bench import copy_database, use_database
+from api.loadtest import WSGITransport, run_mixed, search_terms
+from api.models import Product
+from api.sqlite import current_pragmas
+
+class Command(BaseCommand):
+    help = 'Compare mixed read/write traffic on Django\'s default SQLite setup and the tuned one (copies of the database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=['default', 'tuned'], default=['default', 'tuned'])
+        parser.add_argument('--concurrency', type=int, default=16, help='Virtual users sending requests at once')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per mode')
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument('--prefix', default='load', help='Username prefix used by generate_load_data')
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        database = connections.settings['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('The default database is not SQLite')
+        if options['concurrency'] < 1 or options['threads'] < 1:
+            raise CommandError('--concurrency and --threads must be at least 1')
+
+        rng = random.Random(options['seed'])
+        product_ids = list(Product.objects.filter(in_stock=True).values_list('id', flat=True))
+        if not product_ids:
+            raise CommandError('No products; run generate_load_data first')
+        product_ids = rng.sample(product_ids, min(len(product_ids), 5000))
+        terms = search_terms(Product.objects.filter(id__in=product_ids[:500]).values('name'))
+        usernames = [f"{options['prefix']}-user-{index}" for index in range(options['concurrency'])]
+        source = str(database['NAME'])
+        connections['default'].close()
+
+        modes = {
+            # Django's defaults: rollback journal, a connection per request,
+            # transactions that take the write lock at their first write
+            'default': {'conn_max_age': 0, 'options': {}, 'pragmas': {}, 'journal_mode': 'delete'},
+            'tuned': {
+                'conn_max_age': database['CONN_MAX_AGE'],
+                'options': database['OPTIONS'],
+                'pragmas': getattr(settings, 'SQLITE_PRAGMAS', {}),
+                'journal_mode': None,
+            },
+        }
+
+        from ecommerce_backend.wsgi import application
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        reports = {}
+        try:
+            for mode in options['modes']:
+                config = modes[mode]
+                with tempfile.TemporaryDirectory() as directory:
+                    path = Path(directory) / 'benchmark.sqlite3'
+                    self.stdout.write(f'{mode}: copying {source}')
+                    copy_database(source, path, config['journal_mode'])
+                    with use_database(
+                        path, config['conn_max_age'], config['options'],
+                        SQLITE_PRAGMAS=config['pragmas'],
+                        # Read the catalog from the database, not the response cache
+                        CATALOG_CACHE_TIMEOUT=0,
+                        # Write sessions straight to the copy
+                        SESSION_WRITE_BEHIND_INTERVAL=0,
+                    ):
+                        pragmas = current_pragmas(connections['default'])
+                        connections['default'].close()
+                        with ThreadPoolExecutor(options['threads']) as executor:
+                            opened.clear()
+                            report = asyncio.run(run_mixed(
+                                lambda: WSGITransport(application, executor),
+                                usernames,
+                                options['password'],
+                                product_ids,
+                                terms,
+                                concurrency=options['concurrency'],
+                                duration=options['duration'],
+                                write_ratio=options['write_ratio'],
+                                seed=options['seed'],
+                            ))
+                            report['connections_opened'] = len(opened)
+                reports[mode] = {'conn_max_age': config['conn_max_age'], 'pragmas': pragmas, **report}
+                reads, writes = report['reads'], report['writes']
+                self.stdout.write(
+                    f"{mode}: {report['requests_per_second']} requests/s, "
+                    f"reads p50 {reads.get('p50_ms')} ms p99 {reads.get('p99_ms')} ms, "
+                    f"writes p50 {writes.get('p50_ms')} ms p99 {writes.get('p99_ms')} ms, "
+                    f"{report['errors']} errors, {report['connections_opened']} connections opened"
+                )
+        finally:
+            connection_created.disconnect(count_connection)
+
+        output = json.dumps(reports, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
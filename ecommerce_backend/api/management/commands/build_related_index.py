@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from api.catalog_cache import bump_version
+from api.related import build_related_index
+
+class Command(BaseCommand):
+    help = 'Precompute top-K related products from co-purchases, shared attributes and category'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=8)
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows fetched per database round trip')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Index rows per bulk insert')
+        parser.add_argument('--max-posting', type=int, default=2000,
+                            help='Ignore attributes shared by more products than this')
+        parser.add_argument('--max-order-items', type=int, default=50,
+                            help='Products per order considered for co-purchase pairs')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Building related products index...')
+        start = time.perf_counter()
+        stats = build_related_index(
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+            max_posting=options['max_posting'],
+            max_order_items=options['max_order_items'],
+        )
+        bump_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Scanned {stats['order_lines']} order lines and {stats['products']} products in {elapsed:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {stats['entries']} related product entries"))
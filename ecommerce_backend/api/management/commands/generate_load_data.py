@@ -0,0 +1,64 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.loadgen import LoadDataGenerator
+
+class Command(BaseCommand):
+    help = 'Generate a seeded, production-sized synthetic data set for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='load', help='Prefix for SKUs, usernames and order numbers')
+        parser.add_argument('--categories', type=int, default=60)
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=200000, help='Approximate total')
+        parser.add_argument('--carts', type=int, default=20000, help='Approximate total cart lines')
+        parser.add_argument('--wishlists', type=int, default=20000, help='Approximate total wishlist entries')
+        parser.add_argument('--orders', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_create statement')
+        parser.add_argument('--workers', type=int, default=1, help='Processes generating rows in parallel')
+
+    def handle(self, *args, **options):
+        for name in ('categories', 'products', 'users'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be at least 1')
+        if len(options['prefix']) > 8:
+            raise CommandError('--prefix must be at most 8 characters (order numbers are limited to 20)')
+
+        last_report = [0.0]
+
+        def progress(table, rows, fraction):
+            now = time.perf_counter()
+            if fraction >= 1 or now - last_report[0] > 5:
+                last_report[0] = now
+                self.stdout.write(f'  {table}: {rows} rows ({fraction:.0%})')
+
+        generator = LoadDataGenerator(
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=progress,
+        )
+        self.stdout.write(f"Generating load data (seed {options['seed']}, {options['workers']} worker(s))...")
+        started = time.perf_counter()
+        stats = generator.run(
+            categories=options['categories'],
+            products=options['products'],
+            users=options['users'],
+            reviews=options['reviews'],
+            carts=options['carts'],
+            wishlists=options['wishlists'],
+            orders=options['orders'],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{'step':<16}{'rows':>12}{'seconds':>10}{'rows/s':>12}")
+        total_rows = 0
+        for name, (rows, seconds) in stats.items():
+            self.stdout.write(f'{name:<16}{rows:>12}{seconds:>10.2f}{rows / seconds if seconds else 0:>12.0f}')
+            if name not in ('ratings', 'facets', 'category counts'):
+                total_rows += rows
+        self.stdout.write(self.style.SUCCESS(
+            f'Inserted {total_rows} rows in {elapsed:.1f}s ({total_rows / elapsed:.0f} rows/s overall)'
+        ))
@@ -0,0 +1,57 @@
+import asyncio
+import json
+from django.core.management.base import BaseCommand, CommandError
+from api.loadtest import ASGITransport, HTTPTransport, run_load
+
+class Command(BaseCommand):
+    help = 'Replay shopper journeys against the API and report latency percentiles as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000 (default: in-process ASGI app)')
+        parser.add_argument('--concurrency', type=int, default=10, help='Virtual users running journeys at once')
+        parser.add_argument('--journeys', type=int, default=200)
+        parser.add_argument('--duration', type=float, help='Run for this many seconds instead of a fixed number of journeys')
+        parser.add_argument('--warmup', type=int, default=0, help='Unmeasured journeys to run first')
+        parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause in seconds between journeys')
+        parser.add_argument('--prefix', default='load', help='Username prefix used by generate_load_data')
+        parser.add_argument('--users', type=int, default=1000, help='Number of accounts to log in as')
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--label', help='Free-form label stored in the report, e.g. a commit id')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['users'] < 1:
+            raise CommandError('--concurrency and --users must be at least 1')
+
+        if options['url']:
+            make_transport = lambda: HTTPTransport(options['url'])
+            target = options['url']
+        else:
+            from ecommerce_backend.asgi import application
+            make_transport = lambda: ASGITransport(application)
+            target = 'asgi'
+
+        usernames = [f"{options['prefix']}-user-{index}" for index in range(options['users'])]
+        report = asyncio.run(run_load(
+            make_transport,
+            usernames,
+            options['password'],
+            concurrency=options['concurrency'],
+            journeys=options['journeys'],
+            duration=options['duration'],
+            warmup=options['warmup'],
+            think_time=options['think_time'],
+            seed=options['seed'],
+        ))
+        report = {'label': options['label'], 'target': target, **report}
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(
+                f"{report['journeys']} journeys, {report['requests_per_second']} requests/s; report written to {options['output']}"
+            ))
+        else:
+            self.stdout.write(output)
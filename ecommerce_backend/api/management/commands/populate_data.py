@@ -12,23 +12,19 @@ class Command(BaseCommand):
         categories_data = [
             {
                 'name': "Men's Fashion",
-                'image': "https://asset1.marksandspencer.com/is/image/mands/150827_BSLH-8586_TS_Suiting_final_03.jpg?wid=770",  
-                'count': 100
+                'image': "https://asset1.marksandspencer.com/is/image/mands/150827_BSLH-8586_TS_Suiting_final_03.jpg?wid=770",
             },
             {
                 'name': "Women's Fashion",
-                'image': "https://images.unsplash.com/photo-1445205170230-053b83016050?w=300&h=200&fit=crop",  
-                'count': 120
+                'image': "https://images.unsplash.com/photo-1445205170230-053b83016050?w=300&h=200&fit=crop",
             },
             {
                 'name': "Kids Fashion",
-                'image': "https://petitekingdom.com/wp-content/uploads/2022/01/kleitas-meitenem-petite-kingdom-1024x682.jpg",  
-                'count': 80
+                'image': "https://petitekingdom.com/wp-content/uploads/2022/01/kleitas-meitenem-petite-kingdom-1024x682.jpg",
             },
             {
                 'name': "Footwear",
-                'image': "https://housershoes.com/cdn/shop/files/23FW_SportsMom_OM_151183_151181_082_even_lower_cropped.jpg?crop=region&crop_height=1600&crop_left=0&crop_top=152&crop_width=1600&v=1741787825&width=1600",  
-                'count': 60
+                'image': "https://housershoes.com/cdn/shop/files/23FW_SportsMom_OM_151183_151181_082_even_lower_cropped.jpg?crop=region&crop_height=1600&crop_left=0&crop_top=152&crop_width=1600&v=1741787825&width=1600",
             }
         ]
 
@@ -211,6 +207,9 @@ class Command(BaseCommand):
         ]
 
         for product_data in products_data:
+            # Seeded ratings stand in for reviews we don't create, so seed the
+            # running sum that new reviews are added to as well
+            product_data['rating_sum'] = round(product_data['rating'] * product_data['reviews_count'])
             product, created = Product.objects.get_or_create(
                 sku=product_data['sku'],
                 defaults=product_data
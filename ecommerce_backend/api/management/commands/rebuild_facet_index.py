@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.facets import rebuild_facet_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the product facet index (colors, sizes, price buckets, category)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding facet index...')
+        written = rebuild_facet_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} facet values'))
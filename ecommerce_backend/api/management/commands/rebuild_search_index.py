@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+from api.search import fts_supported, rebuild_search_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index from the api_product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--no-optimize', action='store_true', help='Skip merging index segments after the rebuild')
+
+    def handle(self, *args, **options):
+        conn = connections[options['database']]
+        if not fts_supported(conn):
+            raise CommandError('Full-text search index requires SQLite with FTS5')
+
+        self.stdout.write('Rebuilding product search index...')
+        indexed = rebuild_search_index(conn, optimize=not options['no_optimize'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from api.catalog_cache import bump_version
+from api.ratings import recompute_all_ratings
+
+class Command(BaseCommand):
+    help = 'Rebuild product rating aggregates from the reviews table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recomputing product ratings...')
+        updated = recompute_all_ratings(batch_size=options['batch_size'])
+        # Bulk updates bypass model signals, so invalidate cached catalog pages here
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(f'Updated ratings for {updated} reviewed products'))
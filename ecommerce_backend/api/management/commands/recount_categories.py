@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.catalog_cache import bump_version
+from api.categories import recount_categories
+
+class Command(BaseCommand):
+    help = 'Recompute Category.count (in-stock products) from the product table'
+
+    def handle(self, *args, **options):
+        updated = recount_categories()
+        # Queryset updates bypass model signals, so invalidate cached catalog pages here
+        bump_version()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} categories'))
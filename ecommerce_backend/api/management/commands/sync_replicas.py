@@ -0,0 +1,35 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api.replicas import sync_replica
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the read replicas (REPLICA_DATABASES), once or every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', nargs='+', help='Replica aliases to sync (default: all)')
+        parser.add_argument('--interval', type=float, help='Keep syncing every this many seconds until interrupted')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        aliases = options['database'] or replicas
+        unknown = set(aliases) - set(replicas)
+        if unknown:
+            raise CommandError(f"Not a replica: {', '.join(sorted(unknown))}")
+        if not aliases:
+            raise CommandError('No replicas configured; set DATABASE_REPLICAS')
+
+        while True:
+            for alias in aliases:
+                start = time.perf_counter()
+                pages = sync_replica(alias)
+                self.stdout.write(
+                    f"{alias}: {pages} pages copied to {connections[alias].settings_dict['NAME']} "
+                    f'in {(time.perf_counter() - start) * 1000:.0f} ms'
+                )
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Synced {len(aliases)} replicas'))
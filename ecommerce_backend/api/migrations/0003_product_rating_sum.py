@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:42
+
+from django.db import migrations, models
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+
+def backfill_rating_sum(apps, schema_editor):
+    # Keep the displayed averages unchanged: derive the running sum from the
+    # stored rating and count. `recompute_ratings` rebuilds both from reviews.
+    Product = apps.get_model('api', 'Product')
+    Product.objects.update(
+        rating_sum=Cast(Round(F('rating') * F('reviews_count')), IntegerField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_facet_index(apps, schema_editor):
+    from api.facets import rebuild_facet_index
+    rebuild_facet_index(apps.get_model('api', 'Product'), apps.get_model('api', 'ProductFacet'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_related_product_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='api.product')),
+            ],
+            options={
+                'unique_together': {('facet', 'value', 'product')},
+            },
+        ),
+        migrations.RunPython(build_facet_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:55
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def recount_categories(apps, schema_editor):
+    Category = apps.get_model('api', 'Category')
+    Product = apps.get_model('api', 'Product')
+    in_stock = (
+        Product.objects.filter(category=OuterRef('pk'), in_stock=True)
+        .order_by().values('category').annotate(total=Count('id')).values('total')
+    )
+    Category.objects.update(count=Coalesce(Subquery(in_stock), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_categories, migrations.RunPython.noop),
+    ]
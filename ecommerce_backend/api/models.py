@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 class Category(models.Model):
@@ -21,9 +21,15 @@ class Product(models.Model):
     original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     discount = models.IntegerField(default=0)
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0)
+    rating_sum = models.IntegerField(default=0)
     reviews_count = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
     sku = models.CharField(max_length=50, unique=True)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', db_index=False)
     in_stock = models.BooleanField(default=True)
     colors = models.JSONField(default=list)
     sizes = models.JSONField(default=list)
@@ -35,12 +41,67 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Category counts are adjusted by save signals; commit them together
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
     @property
     def discount_percentage(self):
-        if self.original_price and self.original_price > self.price:
-            return int(((self.original_price - self.price) / self.original_price) * 100)
+        return self.compute_discount_percentage(self.price, self.original_price)
+
+    @staticmethod
+    def compute_discount_percentage(price, original_price):
+        if original_price and original_price > price:
+            return int(((original_price - price) / original_price) * 100)
         return 0
 
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    class Meta:
+        # One index per sort_by ordering, alone and behind the category
+        # filter. SQLite ends every index with the rowid, so these also
+        # serve the trailing id tiebreak. (category, price) doubles as the
+        # category foreign key index.
+        indexes = [
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'rating'], name='product_category_rating_idx'),
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['rating'], name='product_rating_idx'),
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+        ]
+
+class RelatedProduct(models.Model):
+    # Precomputed by the build_related_index command
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_index')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_by')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} (#{self.rank})"
+
+    class Meta:
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='related_product_rank_idx'),
+        ]
+
+class ProductFacet(models.Model):
+    # Facet postings, kept in sync by api.facets
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='facets')
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.product_id}"
+
+    class Meta:
+        unique_together = ['facet', 'value', 'product']
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -53,6 +114,9 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ['product', 'user']
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_recent_idx'),
+        ]
 
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items')
@@ -99,6 +163,17 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        # Status changes adjust the sales rollups in save signals; commit them
+        # together (no savepoint, so checkout's query count is unchanged)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -108,3 +183,66 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.order.order_number} - {self.product.name} x{self.quantity}"
+
+class IdempotencyKey(models.Model):
+    # First response to a request sent with an Idempotency-Key header, see
+    # api.idempotency; status_code is null while that request is running
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+    class Meta:
+        unique_together = ['user', 'key']
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+class SalesRollup(models.Model):
+    # Daily sales counters kept by api.sales; cancelled orders are not counted
+    date = models.DateField()
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+class DailySales(SalesRollup):
+    date = models.DateField(unique=True)
+
+    def __str__(self):
+        return f"{self.date}: {self.revenue}"
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}: {self.revenue}"
+
+    class Meta:
+        unique_together = ['date', 'category']
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.revenue}"
+
+    class Meta:
+        unique_together = ['date', 'product']
+
+class SalesBackfill(models.Model):
+    # A running backfill_sales_rollups (api.sales): orders with
+    # after < id <= last_id are not counted yet and get no live deltas
+    last_id = models.BigIntegerField()
+    after = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Backfill up to {self.last_id}: at {self.after}"
@@ -0,0 +1,249 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination. The cursor carries the ordering values of the
+    row at the page boundary, so every page is one indexed range scan with no
+    OFFSET and no COUNT(*), however deep the client scrolls.
+
+    The ordering comes from ``view.get_keyset_ordering()`` when the view
+    defines it, otherwise from ``ordering``. It must end in a unique column;
+    ``id`` is appended if it is missing.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            ordering = tuple(view.get_keyset_ordering())
+        else:
+            ordering = tuple(self.ordering)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            # Tiebreak in the same direction as the leading column
+            ordering += ('-id',) if ordering and ordering[0].startswith('-') else ('id',)
+        return ordering
+
+    def get_page_size(self, request):
+        if self.page_size_query_param in request.query_params:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = data['v']
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering_fields):
+            raise NotFound(self.invalid_cursor_message)
+
+        model_meta = queryset.model._meta
+        try:
+            values = [
+                model_meta.get_field(name).to_python(value)
+                for name, value in zip(self.ordering_fields, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_row_value(self, row, name):
+        # Rows are model instances, or values_list() tuples whose column
+        # names the view exposes as ``keyset_row_fields``
+        if self.row_fields is not None:
+            return row[self.row_fields.index(name)]
+        return getattr(row, name)
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [_encode_value(self.get_row_value(obj, name)) for name in self.ordering_fields]
+        data = {'v': values}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        url = replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+        return url
+
+    def seek_filter(self, values, reverse):
+        """
+        Rows strictly after ``values`` in the (possibly reversed) ordering:
+            f0 >= v0 AND (f0 > v0 OR (f0 = v0 AND f1 > v1) OR ...)
+        The redundant leading bound lets SQLite use an index range scan.
+        """
+        lookups = []
+        for field in self.ordering:
+            descending = field.startswith('-')
+            if reverse:
+                descending = not descending
+            lookups.append('lt' if descending else 'gt')
+
+        bound_lookup = 'gte' if lookups[0] == 'gt' else 'lte'
+        bound = Q(**{f'{self.ordering_fields[0]}__{bound_lookup}': values[0]})
+        expansion = Q()
+        for index, (name, lookup) in enumerate(zip(self.ordering_fields, lookups)):
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for prior_name, prior_value in zip(self.ordering_fields[:index], values[:index]):
+                clause &= Q(**{prior_name: prior_value})
+            expansion |= clause
+        return bound & expansion
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.finish_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The unevaluated page query: one more row than the page size."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(view)
+        self.ordering_fields = [field.lstrip('-') for field in self.ordering]
+        self.row_fields = getattr(view, 'keyset_row_fields', None)
+        self.page_size = self.get_page_size(request)
+
+        self.cursor_values, self.reverse = self.decode_cursor(request, queryset)
+        if self.reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+        else:
+            ordering = list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self.seek_filter(self.cursor_values, self.reverse))
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, results):
+        values, reverse = self.cursor_values, self.reverse
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = values is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+        self.first, self.last = (results[0], results[-1]) if results else (None, None)
+        return results
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.last is None:
+            # Walked backwards off the start: the next page is the first page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.last)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ReviewPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class PagePagination(PageNumberPagination):
+    """PageNumberPagination that can also count and fetch the page with the async ORM."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+
+class PageOrCursorPagination(BasePagination):
+    """
+    Page-number pagination by default, so existing clients keep their
+    ``count``/``page`` responses; ``?pagination=cursor`` (or any ``cursor``
+    parameter) switches the request to KeysetPagination.
+    """
+    mode_query_param = 'pagination'
+    page_class = PagePagination
+    cursor_class = KeysetPagination
+
+    def get_paginator(self, request):
+        cursor = self.cursor_class()
+        if (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or cursor.cursor_query_param in request.query_params
+        ):
+            return cursor
+        return self.page_class()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return await self.paginator.apaginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,145 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from django.conf import settings
+
+# Password hashing (PBKDF2 by default, deliberately slow) runs in a small
+# process pool, so a burst of logins or sign-ups can use at most
+# PASSWORD_HASHING_WORKERS cores and the rest keep serving the API. Login
+# and register also pass through admit(), which turns requests beyond
+# AUTH_MAX_PENDING in progress away at once instead of letting them tie up
+# more request threads waiting for the pool.
+#
+# Pool workers import only this module and the hashers, so keep this
+# module free of model and DRF imports.
+
+
+class AuthBusy(Exception):
+    pass
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def verify_password(password, encoded):
+    """(valid, new_encoded); new_encoded is set when the hash needs upgrading."""
+    from django.contrib.auth.hashers import check_password, make_password
+    rehashed = []
+    valid = check_password(password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return valid, rehashed[0] if rehashed else None
+
+
+class PasswordPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._admitted = 0
+        self._in_flight = 0
+        self.reset_stats()
+
+    @property
+    def workers(self):
+        return getattr(settings, 'PASSWORD_HASHING_WORKERS', 2)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'AUTH_MAX_PENDING', 16)
+
+    def reset_stats(self):
+        with self._lock:
+            self._completed = 0
+            self._rejected = 0
+            self._peak_queue_depth = 0
+            self._seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'admitted': self._admitted,
+                'in_flight': self._in_flight,
+                'queue_depth': max(0, self._in_flight - self.workers),
+                'peak_queue_depth': self._peak_queue_depth,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'mean_ms': round(self._seconds / self._completed * 1000, 2) if self._completed else 0,
+            }
+
+    @contextmanager
+    def admit(self):
+        """Raise AuthBusy if AUTH_MAX_PENDING auth requests are already in progress."""
+        with self._lock:
+            if self._admitted >= self.max_pending:
+                self._rejected += 1
+                raise AuthBusy
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._admitted -= 1
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: forking a threaded server process is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool (inline when PASSWORD_HASHING_WORKERS is 0)."""
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, self._in_flight - self.workers)
+            executor = self._get_executor() if self.workers > 0 else None
+        try:
+            if executor is None:
+                return fn(*args)
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died; start a new pool next time
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                return fn(*args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._seconds += time.perf_counter() - start
+
+
+password_pool = PasswordPool()
+
+
+def check_user_password(user, password):
+    """user.check_password(), hashing in the pool."""
+    if not user.has_usable_password():
+        return False
+    valid, rehashed = password_pool.run(verify_password, password, user.password)
+    if rehashed:
+        user.password = rehashed
+        user.save(update_fields=['password'])
+    return valid
+
+
+def create_user(username, email, password, **extra_fields):
+    """User.objects.create_user(), hashing in the pool."""
+    from django.contrib.auth.models import User
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        **extra_fields,
+    )
+    user.password = password_pool.run(hash_password, password)
+    user.save()
+    return user
@@ -0,0 +1,174 @@
+import itertools
+import re
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connections
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from .facets import FACETS, facet_count_queryset
+from .models import Category, Product, Review
+from .pagination import KeysetPagination
+from .wishlists import wishlist_ids_queryset
+
+# Runs EXPLAIN QUERY PLAN over the queries the viewsets actually build for
+# every filter/sort combination and flags plans that read a whole table or
+# sort through a temporary B-tree. Used by the analyze_queries command, and
+# callable from tests so a dropped or unusable index fails the build.
+
+SCAN = 'scan'
+TEMP_BTREE = 'temp-btree'
+FINDING_KINDS = (SCAN, TEMP_BTREE)
+
+# Tiny lookup tables where a scan is cheaper than an index
+DEFAULT_ALLOWED_SCANS = ('api_category',)
+
+# Queries (name patterns) whose temp B-tree sort is accepted. The sort only
+# covers the rows the filter selects, which an index cannot also return in
+# order: a price range read off the price index under any other order, facet
+# filters joined through the postings index, and a category in id order
+# (cursor mode without sort_by).
+DEFAULT_ACCEPTED_SORTS = (
+    r'min_price=(?!.*sort_by=price_)',
+    r'color=',
+    r'^products list cursor \[category=[^&]*\]$',
+)
+
+SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def explain(queryset):
+    """EXPLAIN QUERY PLAN detail lines for a queryset, in plan order."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def classify(plan, allowed_scans=DEFAULT_ALLOWED_SCANS, filtered=True):
+    """
+    Findings for plan detail lines. ``SCAN t`` with no index reads the table
+    in rowid order; that is only a full scan when rows are being filtered,
+    since an unfiltered query stops at its LIMIT. ``SCAN t USING INDEX``
+    walks an index in sort order and is not flagged either.
+    """
+    findings = []
+    for detail in plan:
+        match = SCAN_RE.match(detail)
+        if match and filtered and match.group(1) not in allowed_scans:
+            findings.append({'kind': SCAN, 'detail': detail})
+        elif detail.startswith('USE TEMP B-TREE'):
+            findings.append({'kind': TEMP_BTREE, 'detail': detail})
+    return findings
+
+
+def _make_view(viewset_class, action, params=None, user=None, **kwargs):
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user or AnonymousUser()
+    view = viewset_class(action=action, request=request, format_kwarg=None, kwargs=kwargs)
+    return view
+
+
+def _keyset_page(view, queryset, page_size):
+    """The query KeysetPagination runs for a page after the first, or None without data."""
+    paginator = KeysetPagination()
+    paginator.ordering = paginator.get_ordering(view)
+    paginator.ordering_fields = [field.lstrip('-') for field in paginator.ordering]
+    values = queryset.order_by(*paginator.ordering).values_list(*paginator.ordering_fields).first()
+    if values is None:
+        return None
+    return queryset.order_by(*paginator.ordering).filter(paginator.seek_filter(list(values), False))[:page_size]
+
+
+def product_list_params(category='a', min_price='10', max_price='100', color='Black'):
+    """Every combination of the product list filters and sort orders."""
+    from .catalog import PRODUCT_SORT_ORDERINGS
+    filters = [
+        {},
+        {'category': category},
+        {'min_price': min_price, 'max_price': max_price},
+        {'category': category, 'min_price': min_price, 'max_price': max_price},
+        {'color': color},
+    ]
+    sorts = [{}] + [{'sort_by': sort_by} for sort_by in PRODUCT_SORT_ORDERINGS]
+    for filter_params, sort_params in itertools.product(filters, sorts):
+        yield {**filter_params, **sort_params}
+
+
+def _describe(params):
+    return '&'.join(f'{key}={value}' for key, value in params.items()) or '(none)'
+
+
+def collect_queries(page_size=10):
+    """Yield (name, queryset) for the hot read paths of the API."""
+    from .views import CategoryViewSet, OrderViewSet, ProductViewSet, CartViewSet, WishlistViewSet
+
+    category = Category.objects.order_by('id').first()
+    product_id = Product.objects.order_by('id').values_list('id', flat=True).first() or 1
+    user = User(id=User.objects.order_by('id').values_list('id', flat=True).first() or 1)
+    category_name = category.name if category else 'a'
+
+    for params in product_list_params(category=category_name):
+        view = _make_view(ProductViewSet, 'list', params)
+        queryset = view.filter_queryset(view.get_queryset())
+        yield f'products list [{_describe(params)}]', queryset[:page_size]
+        keyset = _keyset_page(view, queryset, page_size)
+        if keyset is not None:
+            yield f'products list cursor [{_describe(params)}]', keyset
+
+    view = _make_view(ProductViewSet, 'featured')
+    yield 'products featured', view.plan_queryset(Product.objects.filter(rating__gte=4.0))[:8]
+
+    view = _make_view(ProductViewSet, 'related', {'product_id': product_id})
+    yield 'products related', view.plan_queryset(
+        Product.objects.filter(related_by__product_id=product_id).order_by('related_by__rank')
+    )[:4]
+
+    view = _make_view(ProductViewSet, 'reviews', pk=product_id)
+    reviews = view.plan_queryset(Review.objects.filter(product_id=product_id))
+    yield 'product reviews', reviews.order_by('-created_at', '-id')[:page_size]
+
+    for facet in FACETS:
+        view = _make_view(ProductViewSet, 'list', {'color': 'Black'})
+        products = view.filter_products(Product.objects.all(), skip_facet=facet)
+        yield f'product facets [{facet}]', facet_count_queryset(facet, products.values('id'))
+
+    if category is not None:
+        view = _make_view(CategoryViewSet, 'products', pk=category.pk)
+        yield 'category products', view.plan_queryset(Product.objects.filter(category=category))
+
+    for viewset_class, name in ((CartViewSet, 'cart'), (WishlistViewSet, 'wishlist'), (OrderViewSet, 'orders')):
+        view = _make_view(viewset_class, 'list', user=user)
+        yield f'{name} list', view.get_queryset()[:page_size]
+
+    view = _make_view(OrderViewSet, 'retrieve', user=user)
+    yield 'order detail', view.get_queryset()[:1]
+
+    yield 'wishlist ids', wishlist_ids_queryset(user)
+
+
+def analyze_queries(page_size=10, allowed_scans=DEFAULT_ALLOWED_SCANS, name_filter=None,
+                    accepted_sorts=DEFAULT_ACCEPTED_SORTS):
+    """Report entries: {'name', 'sql', 'plan', 'findings'} for every collected query."""
+    report = []
+    for name, queryset in collect_queries(page_size=page_size):
+        if name_filter and name_filter not in name:
+            continue
+        plan = explain(queryset)
+        findings = classify(plan, allowed_scans=allowed_scans, filtered=bool(queryset.query.where))
+        if any(re.search(pattern, name) for pattern in accepted_sorts):
+            findings = [finding for finding in findings if finding['kind'] != TEMP_BTREE]
+        report.append({
+            'name': name,
+            'sql': str(queryset.query),
+            'plan': plan,
+            'findings': findings,
+        })
+    return report
+
+
+def failures(report, kinds=FINDING_KINDS):
+    """Report entries with at least one finding of the given kinds."""
+    return [
+        entry for entry in report
+        if any(finding['kind'] in kinds for finding in entry['findings'])
+    ]
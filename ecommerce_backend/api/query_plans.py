@@ -0,0 +1,123 @@
+from django.db.models import OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Review, OrderItem
+
+# Product columns rendered by ProductListSerializer (category is joined in
+# full), plus created_at which the keyset paginator reads for sort_by=newest
+PRODUCT_LIST_FIELDS = (
+    'id', 'name', 'price', 'original_price', 'discount', 'rating',
+    'reviews_count', 'sku', 'category', 'in_stock', 'images', 'created_at'
+)
+
+
+# Most recent reviews embedded in the product detail payload; the rest are
+# paged through /api/products/{id}/reviews/
+PRODUCT_DETAIL_REVIEWS = 5
+
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+
+
+def related_fields(prefix, fields):
+    return tuple(f'{prefix}__{field}' for field in fields)
+
+
+class QueryPlan:
+    """Joins, prefetches, annotations and column projection applied to a viewset queryset."""
+
+    def __init__(self, select_related=(), prefetch_related=(), only=(), annotate=None):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only)
+        self.annotate = dict(annotate or {})
+
+    def apply(self, queryset):
+        if self.annotate:
+            queryset = queryset.annotate(**self.annotate)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+class QueryPlanMixin:
+    """
+    Lets a viewset declare one QueryPlan per action in ``query_plans``.
+    The ``default`` key is used for actions without their own plan.
+    """
+    query_plans = {}
+
+    def get_query_plan(self, action=None):
+        action = action or getattr(self, 'action', None)
+        return self.query_plans.get(action) or self.query_plans.get('default')
+
+    def plan_queryset(self, queryset, action=None):
+        plan = self.get_query_plan(action)
+        if plan is None:
+            return queryset
+        return plan.apply(queryset)
+
+
+PRODUCT_LIST_PLAN = QueryPlan(
+    select_related=['category'],
+    only=PRODUCT_LIST_FIELDS,
+)
+
+REVIEW_LIST_PLAN = QueryPlan(
+    select_related=['user'],
+    only=('id', 'product', 'user', 'rating', 'comment', 'created_at') + related_fields('user', USER_FIELDS),
+)
+
+PRODUCT_DETAIL_PLAN = QueryPlan(
+    select_related=['category'],
+    prefetch_related=[
+        Prefetch(
+            'reviews',
+            queryset=REVIEW_LIST_PLAN.apply(Review.objects.order_by('-created_at', '-id'))[:PRODUCT_DETAIL_REVIEWS],
+            to_attr='top_reviews',
+        ),
+    ],
+)
+
+CART_PLAN = QueryPlan(
+    select_related=['product__category'],
+    only=('id', 'user', 'quantity', 'created_at', 'updated_at', 'product') + related_fields('product', PRODUCT_LIST_FIELDS),
+)
+
+WISHLIST_PLAN = QueryPlan(
+    select_related=['product__category'],
+    only=('id', 'user', 'created_at', 'product') + related_fields('product', PRODUCT_LIST_FIELDS),
+)
+
+ORDER_PLAN = QueryPlan(
+    select_related=['user'],
+    prefetch_related=[
+        Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('product__category').only(
+                *('id', 'order', 'quantity', 'price', 'created_at', 'product'),
+                *related_fields('product', PRODUCT_LIST_FIELDS)
+            ),
+        ),
+    ],
+)
+
+# Order history rows: item count and the first item's first product image
+# come from correlated subqueries on the order_id index, one query per page
+ORDER_SUMMARY_PLAN = QueryPlan(
+    only=('id', 'order_number', 'status', 'total_amount', 'created_at'),
+    annotate={
+        'item_count': Coalesce(
+            Subquery(
+                OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+                .values('order').annotate(total=Sum('quantity')).values('total')
+            ),
+            Value(0),
+        ),
+        'thumbnail': Subquery(
+            OrderItem.objects.filter(order=OuterRef('pk')).order_by('id').values('product__images__0')[:1]
+        ),
+    },
+)
@@ -0,0 +1,83 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import F, Count, FloatField, ExpressionWrapper
+from django.db.models.functions import Round
+from .models import Product, Review
+
+RATING_PLACES = Decimal('0.1')
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f'rating_{star}_count' for star in STARS]
+AGGREGATE_FIELDS = ['rating', 'rating_sum', 'reviews_count'] + HISTOGRAM_FIELDS
+
+
+def histogram_field(rating):
+    if rating not in STARS:
+        raise ValueError(f'Rating must be between 1 and 5, got {rating!r}')
+    return f'rating_{rating}_count'
+
+
+def apply_review_rating(product_id, rating):
+    """
+    Fold one new review into the product's rating aggregates with a single
+    atomic UPDATE. F() expressions read the row's current values inside the
+    statement, so concurrent reviews cannot overwrite each other's counts.
+    """
+    new_sum = F('rating_sum') + rating
+    new_count = F('reviews_count') + 1
+    star_field = histogram_field(rating)
+    return Product.objects.filter(id=product_id).update(
+        rating_sum=new_sum,
+        reviews_count=new_count,
+        rating=Round(ExpressionWrapper(new_sum * 1.0 / new_count, output_field=FloatField()), 1),
+        **{star_field: F(star_field) + 1},
+    )
+
+
+def average_rating(rating_sum, reviews_count):
+    if not reviews_count:
+        return Decimal('0')
+    return (Decimal(rating_sum) / Decimal(reviews_count)).quantize(RATING_PLACES, rounding=ROUND_HALF_UP)
+
+
+def recompute_all_ratings(batch_size=1000):
+    """
+    Rebuild the rating aggregates and star histogram of every product from
+    the Review table with one grouped query. Returns the number of products
+    that have reviews.
+    """
+    with transaction.atomic():
+        Product.objects.update(rating=0, rating_sum=0, reviews_count=0, **{name: 0 for name in HISTOGRAM_FIELDS})
+
+        # One row per (product, star), ordered so each product's rows are adjacent
+        totals = (
+            Review.objects.order_by('product_id', 'rating')
+            .values('product_id', 'rating')
+            .annotate(count=Count('id'))
+        )
+        batch = []
+        updated = 0
+        product = None
+        for row in totals.iterator(chunk_size=batch_size):
+            if product is None or product.id != row['product_id']:
+                if product is not None:
+                    batch.append(finish_product(product))
+                product = Product(id=row['product_id'], rating_sum=0, reviews_count=0,
+                                  **{name: 0 for name in HISTOGRAM_FIELDS})
+            setattr(product, histogram_field(row['rating']), row['count'])
+            product.rating_sum += row['rating'] * row['count']
+            product.reviews_count += row['count']
+            if len(batch) >= batch_size:
+                Product.objects.bulk_update(batch, AGGREGATE_FIELDS)
+                updated += len(batch)
+                batch = []
+        if product is not None:
+            batch.append(finish_product(product))
+        if batch:
+            Product.objects.bulk_update(batch, AGGREGATE_FIELDS)
+            updated += len(batch)
+    return updated
+
+
+def finish_product(product):
+    product.rating = average_rating(product.rating_sum, product.reviews_count)
+    return product
@@ -0,0 +1,140 @@
+import heapq
+from collections import Counter, defaultdict
+from django.db import transaction
+from .models import Product, OrderItem, RelatedProduct
+
+# Score weights: bought together beats similar attributes beats same category
+CO_PURCHASE_WEIGHT = 3.0
+ATTRIBUTE_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+
+
+def co_purchase_counts(chunk_size=10000, max_order_items=50):
+    """
+    Count how often each pair of products shares an order. Order lines are
+    streamed in order_id order with a server-side chunked iterator, so only
+    one order's products are held at a time. Very large orders are truncated
+    to ``max_order_items`` products to bound the quadratic pair expansion.
+    """
+    counts = defaultdict(Counter)
+    lines = (
+        OrderItem.objects.order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    current_order, basket = None, set()
+    processed = 0
+
+    def flush():
+        items = sorted(basket)[:max_order_items]
+        for index, product_id in enumerate(items):
+            for other_id in items[index + 1:]:
+                counts[product_id][other_id] += 1
+                counts[other_id][product_id] += 1
+
+    for order_id, product_id in lines:
+        if order_id != current_order:
+            flush()
+            current_order, basket = order_id, set()
+        basket.add(product_id)
+        processed += 1
+    flush()
+    return counts, processed
+
+
+def product_attributes(chunk_size=10000):
+    """id -> (category_id, rating, attribute tokens from colors and features)."""
+    attributes = {}
+    rows = Product.objects.order_by('id').values_list(
+        'id', 'category_id', 'rating', 'colors', 'features'
+    ).iterator(chunk_size=chunk_size)
+    for product_id, category_id, rating, colors, features in rows:
+        tokens = frozenset(
+            [f'color:{value}'.lower() for value in colors or []]
+            + [f'feature:{value}'.lower() for value in features or []]
+        )
+        attributes[product_id] = (category_id, float(rating), tokens)
+    return attributes
+
+
+def score_related(attributes, co_counts, top_k=8, max_posting=2000):
+    """
+    Yield (product_id, [(related_id, score), ...]) with up to ``top_k``
+    entries per product, best first. Attribute candidates come from an
+    inverted index over tokens; tokens shared by more than ``max_posting``
+    products carry little signal and are skipped.
+    """
+    postings = defaultdict(list)
+    by_category = defaultdict(list)
+    for product_id, (category_id, rating, tokens) in attributes.items():
+        by_category[category_id].append((rating, product_id))
+        for token in tokens:
+            postings[token].append(product_id)
+    postings = {token: ids for token, ids in postings.items() if len(ids) <= max_posting}
+    # Best-rated products per category fill lists with too few candidates
+    category_fill = {
+        category_id: [product_id for _, product_id in heapq.nlargest(top_k + 1, members)]
+        for category_id, members in by_category.items()
+    }
+
+    for product_id, (category_id, _, tokens) in attributes.items():
+        shared = Counter()
+        for token in tokens:
+            for other_id in postings.get(token, ()):
+                if other_id != product_id:
+                    shared[other_id] += 1
+
+        co = co_counts.get(product_id, {})
+        co_max = max(co.values(), default=0)
+        scores = {}
+        for other_id in set(shared) | set(co):
+            other = attributes.get(other_id)
+            if other is None:
+                continue
+            other_category, _, other_tokens = other
+            score = 0.0
+            if co_max:
+                score += CO_PURCHASE_WEIGHT * co.get(other_id, 0) / co_max
+            if shared[other_id]:
+                score += ATTRIBUTE_WEIGHT * shared[other_id] / (len(tokens) + len(other_tokens) - shared[other_id])
+            if other_category == category_id:
+                score += CATEGORY_WEIGHT
+            scores[other_id] = score
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        if len(best) < top_k:
+            chosen = {other_id for other_id, _ in best}
+            for other_id in category_fill.get(category_id, ()):
+                if len(best) >= top_k:
+                    break
+                if other_id != product_id and other_id not in chosen:
+                    best.append((other_id, CATEGORY_WEIGHT))
+        yield product_id, best
+
+
+def build_related_index(top_k=8, chunk_size=10000, batch_size=5000, max_posting=2000, max_order_items=50):
+    co_counts, order_lines = co_purchase_counts(chunk_size=chunk_size, max_order_items=max_order_items)
+    attributes = product_attributes(chunk_size=chunk_size)
+
+    written = 0
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        batch = []
+        for product_id, related in score_related(attributes, co_counts, top_k=top_k, max_posting=max_posting):
+            batch.extend(
+                RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=score)
+                for rank, (related_id, score) in enumerate(related)
+            )
+            if len(batch) >= batch_size:
+                RelatedProduct.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            RelatedProduct.objects.bulk_create(batch)
+            written += len(batch)
+
+    return {
+        'order_lines': order_lines,
+        'products': len(attributes),
+        'entries': written,
+    }
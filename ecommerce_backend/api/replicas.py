@@ -0,0 +1,144 @@
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Catalog and review reads in safe (GET/HEAD/OPTIONS) requests go to one of
+# the REPLICA_DATABASES, picked once per request so its queries agree with
+# each other. Everything else reads from and writes to the primary: other
+# models, unsafe requests, and code outside a request (management
+# commands, background threads).
+#
+# Read-your-writes: a request that writes sets a cookie that keeps the
+# client's reads on the primary, and out of the catalog cache, for
+# REPLICA_PIN_SECONDS, which should cover the replicas' lag behind the
+# primary (the sync_replicas interval).
+
+REPLICA_MODELS = {'category', 'product', 'review', 'productfacet', 'relatedproduct'}
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RequestRouting:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 30)
+
+
+def primary_pinned(request):
+    return PIN_COOKIE in request.COOKIES
+
+
+def current_replica():
+    """The replica this request's catalog reads go to, or None for the primary."""
+    routing = _routing.get()
+    return routing.replica if routing is not None else None
+
+
+def choose_replica(request):
+    replicas = replica_aliases()
+    if not replicas or request.method not in SAFE_METHODS or primary_pinned(request):
+        return None
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and routing.replica and model._meta.model_name in REPLICA_MODELS:
+            return routing.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # Read the rest of this request from the primary too
+            routing.replica = None
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary (sync_replicas)
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    # Runs in whichever mode the handler does, so async views are not
+    # adapted onto a worker thread for the whole request
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(choose_replica(request))
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_writer(routing, response)
+
+    async def __acall__(self, request):
+        routing = RequestRouting(choose_replica(request))
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin_writer(routing, response)
+
+    def pin_writer(self, routing, response):
+        if routing.wrote and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE, secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
+
+
+def sync_replica(alias, source=DEFAULT_DB_ALIAS):
+    """
+    Copy the ``source`` database into the replica ``alias`` with SQLite's
+    online backup API, in one transaction on the replica, so its readers see
+    either the old or the new copy. Afterwards the replica is recorded as
+    current up to the catalog version read before the copy began, which the
+    catalog cache checks before storing a body read from it. Returns the
+    number of pages copied.
+    """
+    from .catalog_cache import get_version, mark_replica_synced
+    primary, replica = connections[source], connections[alias]
+    if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+        raise ValueError('Replicas can only be synced between SQLite databases')
+    primary.ensure_connection()
+    replica.ensure_connection()
+    version = get_version()
+    copied = []
+    primary.connection.backup(replica.connection, progress=lambda status, remaining, total: copied.append(total))
+    mark_replica_synced(alias, version)
+    return copied[-1] if copied else 0
@@ -0,0 +1,213 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import connections, router, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from .models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem, SalesBackfill
+
+# Daily sales rollups: orders, units and revenue per day, per category and
+# day, and per product and day. checkout_cart records each new order in its
+# own transaction and order signals apply status changes (see signals.py);
+# backfill_sales_rollups rebuilds them from the order tables, while live
+# changes to orders it has not read yet are left to it. Cancelled
+# orders are not counted. The analytics endpoints read only these tables,
+# so reports never scan the order tables or hold up writes to them.
+
+UNCOUNTED_STATUSES = {'cancelled'}
+DEFAULT_REPORT_DAYS = 30
+
+
+def is_counted(status):
+    return status not in UNCOUNTED_STATUSES
+
+
+def order_day(order_created_at):
+    return timezone.localdate(order_created_at)
+
+
+def order_lines(order_ids):
+    """{order_id: [(product_id, category_id, quantity, price), ...]} in one query."""
+    lines = defaultdict(list)
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'product_id', 'product__category_id', 'quantity', 'price'
+    )
+    for order_id, *line in rows:
+        lines[order_id].append(tuple(line))
+    return lines
+
+
+class SalesDeltas:
+    """Rollup increments for a batch of orders, written with apply()."""
+
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, 0, Decimal('0')])
+        self.categories = defaultdict(lambda: [0, 0, Decimal('0')])
+        self.products = defaultdict(lambda: [0, 0, Decimal('0')])
+
+    def add_order(self, day, lines, sign=1):
+        """Count an order placed on ``day`` with (product_id, category_id, quantity, price) lines."""
+        self.days[day][0] += sign
+        categories, products = set(), set()
+        for product_id, category_id, quantity, price in lines:
+            for totals in (self.days[day], self.categories[day, category_id], self.products[day, product_id]):
+                totals[1] += sign * quantity
+                totals[2] += sign * price * quantity
+            categories.add(category_id)
+            products.add(product_id)
+        # An order counts once for every category and product in it
+        for category_id in categories:
+            self.categories[day, category_id][0] += sign
+        for product_id in products:
+            self.products[day, product_id][0] += sign
+
+    def apply(self):
+        add_to_rollup(DailySales, ['date'], [(day, *totals) for day, totals in self.days.items()])
+        add_to_rollup(DailyCategorySales, ['date', 'category'], [(*key, *totals) for key, totals in self.categories.items()])
+        add_to_rollup(DailyProductSales, ['date', 'product'], [(*key, *totals) for key, totals in self.products.items()])
+
+
+def add_to_rollup(model, key_fields, rows, batch_size=500):
+    """
+    Add (*key, orders, units, revenue) rows to ``model``'s counters with
+    INSERT ... ON CONFLICT DO UPDATE, one statement per batch. Django's
+    bulk_create(update_conflicts=True) can only overwrite counters, not add.
+    """
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    meta = model._meta
+    keys = [meta.get_field(name).column for name in key_fields]
+    counters = ['orders', 'units', 'revenue']
+    values_sql = '(' + ', '.join(['%s'] * (len(keys) + len(counters))) + ')'
+    updates = ', '.join(f'{quote(column)} = {quote(meta.db_table)}.{quote(column)} + excluded.{quote(column)}' for column in counters)
+    adapt_date, adapt_decimal = connection.ops.adapt_datefield_value, connection.ops.adapt_decimalfield_value
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for day, *key, orders, units, revenue in batch:
+                params.extend([adapt_date(day), *key, orders, units, adapt_decimal(revenue, 14, 2)])
+            cursor.execute(
+                f'INSERT INTO {quote(meta.db_table)} ({", ".join(quote(column) for column in keys + counters)}) '
+                f'VALUES {", ".join([values_sql] * len(batch))} '
+                f'ON CONFLICT ({", ".join(quote(column) for column in keys)}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def record_order_sales(order, lines=None, sign=1):
+    """
+    Add an order (subtract it, with sign=-1) to the rollups, in the caller's
+    transaction. ``lines`` are (product_id, category_id, quantity, price)
+    tuples, read from the order's items when not given.
+    """
+    if lines is None:
+        lines = order_lines([order.pk])[order.pk]
+    deltas = SalesDeltas()
+    deltas.add_order(order_day(order.created_at), lines, sign)
+    deltas.apply()
+
+
+def backfill_pending(order_id):
+    """
+    Whether a running backfill has yet to read order ``order_id``. It counts
+    the order as it finds it, so a live delta now would count a change twice.
+    Call in the transaction that changes the order.
+    """
+    return SalesBackfill.objects.select_for_update().filter(after__lt=order_id, last_id__gte=order_id).exists()
+
+
+def backfill_sales_rollups(chunk_size=2000, progress=None):
+    """
+    Rebuild every rollup from the order tables, reading orders in id order
+    ``chunk_size`` at a time and counting each chunk in its own short
+    transaction, so live checkouts are only held up briefly. Its progress is
+    kept in SalesBackfill for backfill_pending; if it is interrupted, run it
+    again. Returns the number of orders read.
+    """
+    with transaction.atomic():
+        # Orders placed from here on are recorded live
+        for model in (DailySales, DailyCategorySales, DailyProductSales, SalesBackfill):
+            model.objects.all().delete()
+        last_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        backfill = SalesBackfill.objects.create(last_id=last_id)
+
+    after, done = 0, 0
+    while after < last_id:
+        # Statuses are read in the transaction that counts them and moves
+        # the cursor past them, so a status change is either seen here or
+        # applied live afterwards, never both
+        with transaction.atomic():
+            orders = list(
+                Order.objects.filter(id__gt=after, id__lte=last_id).order_by('id')
+                .values_list('id', 'created_at', 'status')[:chunk_size]
+            )
+            if not orders:
+                break
+            lines = order_lines([order_id for order_id, _, status in orders if is_counted(status)])
+            deltas = SalesDeltas()
+            for order_id, created_at, status in orders:
+                if is_counted(status):
+                    deltas.add_order(order_day(created_at), lines[order_id])
+            deltas.apply()
+            after = orders[-1][0]
+            SalesBackfill.objects.filter(pk=backfill.pk).update(after=after)
+        done += len(orders)
+        if progress is not None:
+            progress(done, after, last_id)
+    backfill.delete()
+    return done
+
+
+def report_range(params):
+    """(start, end) dates from ?start=&end= (ISO dates), by default the last 30 days."""
+    end = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+    start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
+
+
+def _totals(rows, key_names):
+    return [
+        {**dict(zip(key_names, keys)), 'orders': orders, 'units': units, 'revenue': revenue}
+        for *keys, orders, units, revenue in rows
+    ]
+
+
+def daily_sales(start, end, category_id=None, product_id=None):
+    """Per-day totals, overall or for one category or product."""
+    if product_id is not None:
+        queryset = DailyProductSales.objects.filter(product_id=product_id)
+    elif category_id is not None:
+        queryset = DailyCategorySales.objects.filter(category_id=category_id)
+    else:
+        queryset = DailySales.objects.all()
+    rows = queryset.filter(date__range=(start, end)).order_by('date').values_list('date', 'orders', 'units', 'revenue')
+    return _totals(rows, ['date'])
+
+
+def _range_totals(queryset, start, end, keys):
+    return (
+        queryset.filter(date__range=(start, end)).values_list(*keys)
+        .annotate(order_count=Sum('orders'), unit_count=Sum('units'), revenue_total=Sum('revenue'))
+        .order_by('-revenue_total', keys[0])
+    )
+
+
+def category_sales(start, end):
+    """Totals per category over the range, highest revenue first."""
+    rows = _range_totals(DailyCategorySales.objects.all(), start, end, ['category_id', 'category__name'])
+    return _totals(rows, ['category', 'name'])
+
+
+def product_sales(start, end, category_id=None, limit=20):
+    """Top products by revenue over the range, optionally within one category."""
+    queryset = DailyProductSales.objects.all()
+    if category_id is not None:
+        queryset = queryset.filter(product__category_id=category_id)
+    rows = _range_totals(queryset, start, end, ['product_id', 'product__name'])
+    return _totals(rows[:limit], ['product', 'name'])
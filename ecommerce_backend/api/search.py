@@ -0,0 +1,155 @@
+import re
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Full-text index over Product.name/description. It is an external-content
+# FTS5 table, so it stores only the index and reads column values from
+# api_product; triggers keep it in sync with every insert, update and delete.
+FTS_TABLE = 'api_product_fts'
+
+# bm25() column weights: a hit in the name outranks one in the description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 12
+
+CREATE_TABLE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, description,
+    content='api_product', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)
+"""
+
+TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON api_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON api_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON api_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_supported(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def install_search_index(conn=None, rebuild=False):
+    conn = conn or connection
+    if not fts_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_TABLE_SQL)
+        # Recreated on every migrate: SQLite drops a table's triggers when
+        # Django's schema editor rebuilds api_product for an AlterField.
+        for sql in TRIGGERS_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(conn=None):
+    conn = conn or connection
+    if not fts_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def rebuild_search_index(conn=None, optimize=True):
+    conn = conn or connection
+    install_search_index(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        if optimize:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def build_match_query(term):
+    """
+    Turn free text into an FTS5 MATCH expression: every word becomes a quoted
+    prefix query and all of them must match. Returns '' if there are no words.
+    """
+    tokens = TOKEN_RE.findall(term or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def icontains_search(queryset, term):
+    return queryset.filter(
+        Q(name__icontains=term) | Q(description__icontains=term)
+    )
+
+
+def fts_search(queryset, term, with_snippet=True):
+    """
+    Restrict ``queryset`` to products matching ``term`` and annotate
+    ``search_rank`` (BM25, lower is better) and ``search_snippet``.
+    """
+    match = build_match_query(term)
+    if not match:
+        return icontains_search(queryset, term)
+
+    select = {
+        'search_rank': f'bm25({FTS_TABLE}, %s, %s)',
+    }
+    select_params = [NAME_WEIGHT, DESCRIPTION_WEIGHT]
+    if with_snippet:
+        select['search_snippet'] = f"snippet({FTS_TABLE}, -1, '<mark>', '</mark>', '…', %s)"
+        select_params.append(SNIPPET_TOKENS)
+
+    return queryset.extra(
+        select=select,
+        select_params=select_params,
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = api_product.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match],
+    )
+
+
+def search_products(queryset, term, with_snippet=True):
+    if fts_supported(connections[queryset.db]):
+        return fts_search(queryset, term, with_snippet=with_snippet)
+    return icontains_search(queryset, term)
+
+
+def search_filter(term, using='default'):
+    """
+    Matching products as a plain ``Q`` (an id subquery on the FTS table), for
+    querysets that only need membership, e.g. inside other subqueries where
+    the join added by fts_search would not survive aliasing.
+    """
+    match = build_match_query(term)
+    if not match or not fts_supported(connections[using]):
+        return Q(name__icontains=term) | Q(description__icontains=term)
+    return Q(id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
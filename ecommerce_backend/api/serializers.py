@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
 from .models import Category, Product, Review, Cart, Wishlist, Order, OrderItem
+from .ratings import apply_review_rating
+from .query_plans import PRODUCT_DETAIL_REVIEWS
+from .fastpath import FastRows
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,9 +30,10 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
+    reviews = serializers.SerializerMethodField()
     discount_percentage = serializers.ReadOnlyField()
     average_rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
@@ -36,13 +41,19 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'description', 'price', 'original_price', 'discount',
             'discount_percentage', 'rating', 'reviews_count', 'sku', 'category',
             'in_stock', 'colors', 'sizes', 'features', 'images', 'reviews',
-            'average_rating', 'created_at', 'updated_at'
+            'average_rating', 'rating_histogram', 'created_at', 'updated_at'
         ]
 
+    def get_reviews(self, obj):
+        # Only the most recent reviews; the full list is paginated separately
+        reviews = getattr(obj, 'top_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.select_related('user').order_by('-created_at', '-id')[:PRODUCT_DETAIL_REVIEWS]
+        return ReviewSerializer(reviews, many=True, context=self.context).data
+
     def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
+        if obj.reviews_count:
+            return obj.rating_sum / obj.reviews_count
         return 0
 
 class ProductListSerializer(serializers.ModelSerializer):
@@ -56,6 +67,15 @@ class ProductListSerializer(serializers.ModelSerializer):
             'rating', 'reviews_count', 'sku', 'category', 'in_stock', 'images'
         ]
 
+class ProductSearchSerializer(ProductListSerializer):
+    search_snippet = serializers.SerializerMethodField()
+
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ['search_snippet']
+
+    def get_search_snippet(self, obj):
+        return getattr(obj, 'search_snippet', None)
+
 class CartSerializer(serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
     total_price = serializers.SerializerMethodField()
@@ -92,6 +112,14 @@ class OrderSerializer(serializers.ModelSerializer):
             'payment_method', 'items', 'user', 'created_at', 'updated_at'
         ]
 
+class OrderSummarySerializer(serializers.ModelSerializer):
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'order_number', 'status', 'total_amount', 'item_count', 'thumbnail', 'created_at']
+
 class CreateReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -100,21 +128,36 @@ class CreateReviewSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         product_id = self.context['product_id']
         user = self.context['user']
-        product = Product.objects.get(id=product_id)
-        
-        # Update product rating
-        review = Review.objects.create(
-            product=product,
-            user=user,
-            **validated_data
-        )
-        
-        # Recalculate product rating
-        reviews = product.reviews.all()
-        if reviews:
-            avg_rating = sum(r.rating for r in reviews) / len(reviews)
-            product.rating = round(avg_rating, 1)
-            product.reviews_count = len(reviews)
-            product.save()
-        
-        return review 
\ No newline at end of file
+
+        try:
+            with transaction.atomic():
+                review = Review.objects.create(
+                    product_id=product_id,
+                    user=user,
+                    **validated_data
+                )
+                # Update product rating aggregates in place
+                apply_review_rating(product_id, review.rating)
+        except IntegrityError:
+            raise serializers.ValidationError({'error': 'You have already reviewed this product'})
+
+        return review
+
+# Fast-path renderers for hot list endpoints (see fastpath.py). created_at is
+# fetched for keyset cursors on sort_by=newest.
+PRODUCT_LIST_ROWS = FastRows(
+    ProductListSerializer,
+    computed={
+        'discount_percentage': (('price', 'original_price'), Product.compute_discount_percentage),
+    },
+    extra_columns=('created_at',),
+)
+
+PRODUCT_SEARCH_ROWS = FastRows(
+    ProductSearchSerializer,
+    computed={
+        'discount_percentage': (('price', 'original_price'), Product.compute_discount_percentage),
+        'search_snippet': (('search_snippet',), lambda snippet: snippet),
+    },
+    extra_columns=('created_at',),
+)
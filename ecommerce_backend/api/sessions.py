@@ -0,0 +1,142 @@
+import atexit
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+# Session engine (SESSION_ENGINE = 'api.sessions'): cached_db with the cache
+# as the primary copy and django_session written behind it. Saves and
+# deletes go to the cache at once and are queued; a background thread
+# writes the queue every SESSION_WRITE_BEHIND_INTERVAL seconds in one
+# transaction, so repeated saves of a session cost one upsert. Sessions
+# missing from the cache load from the queue, then the table.
+#
+# Processes only see each other's recent sessions through the cache, so
+# run several processes with a shared cache (CACHE_BACKEND=redis or file),
+# or set the interval to 0 to write through.
+
+logger = logging.getLogger('django.contrib.sessions')
+
+DELETED = object()
+
+
+class WriteBehindQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'SESSION_WRITE_BEHIND_INTERVAL', 5)
+
+    def put(self, session_key, row):
+        """Queue ``row`` ((session_data, expire_date), or DELETED) for ``session_key``."""
+        with self._lock:
+            self._pending[session_key] = row
+            start = self._thread is None and self.interval > 0
+            if start:
+                self._thread = threading.Thread(target=self._run, name='session-write-behind', daemon=True)
+        if self.interval <= 0:
+            self.flush()
+        elif start:
+            atexit.register(self.flush)
+            self._thread.start()
+
+    def peek(self, session_key):
+        return self._pending.get(session_key)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            # One connection per flush; don't hold it open between them
+            connections.close_all()
+
+    def flush(self):
+        """Write every queued change; returns the number of sessions written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        model = DBStore.get_model_class()
+        deleted = [key for key, row in pending.items() if row is DELETED]
+        saved = [
+            model(session_key=key, session_data=row[0], expire_date=row[1])
+            for key, row in pending.items() if row is not DELETED
+        ]
+        using = router.db_for_write(model)
+        try:
+            with transaction.atomic(using=using):
+                if deleted:
+                    model.objects.using(using).filter(session_key__in=deleted).delete()
+                if saved:
+                    model.objects.using(using).bulk_create(
+                        saved, update_conflicts=True,
+                        unique_fields=['session_key'], update_fields=['session_data', 'expire_date'],
+                    )
+        except DatabaseError:
+            logger.exception('Error writing sessions to the database')
+            with self._lock:
+                # Requeue, unless a newer change arrived meanwhile
+                for key, row in pending.items():
+                    self._pending.setdefault(key, row)
+            return 0
+        return len(pending)
+
+
+write_behind = WriteBehindQueue()
+
+
+class SessionStore(CachedDBStore):
+    def _get_session_from_db(self):
+        # Queued changes are newer than the table
+        row = write_behind.peek(self.session_key)
+        if row is DELETED:
+            self._session_key = None
+            return None
+        if row is not None:
+            if row[1] <= timezone.now():
+                self._session_key = None
+                return None
+            return self.model(session_key=self.session_key, session_data=row[0], expire_date=row[1])
+        return super()._get_session_from_db()
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        try:
+            if must_create:
+                # cache.add, rather than a database insert, keeps new keys unique
+                if not self._cache.add(self.cache_key, data, self.get_expiry_age()):
+                    raise CreateError
+            else:
+                self._cache.set(self.cache_key, data, self.get_expiry_age())
+        except CreateError:
+            raise
+        except Exception:
+            logger.exception('Error saving to cache (%s); writing the session through', self._cache)
+            return DBStore.save(self, must_create)
+        write_behind.put(self.session_key, (self.encode(data), self.get_expiry_date()))
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+        write_behind.put(session_key, DELETED)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
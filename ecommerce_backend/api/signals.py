@@ -0,0 +1,91 @@
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from .auth import user_cache
+from .catalog_cache import bump_version_on_commit
+from .categories import apply_count_change, category_names
+from .facets import FACET_SOURCE_FIELDS, sync_product_facets
+from .models import Category, Order, Product, Review
+from .sales import backfill_pending, is_counted, record_order_sales
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_version_on_commit()
+
+
+@receiver(post_save, sender=Product)
+def update_product_facets(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not FACET_SOURCE_FIELDS.intersection(update_fields):
+        return
+    sync_product_facets(instance)
+
+
+COUNT_SOURCE_FIELDS = {'category', 'category_id', 'in_stock'}
+
+
+def _counts_affected(update_fields):
+    return update_fields is None or bool(COUNT_SOURCE_FIELDS.intersection(update_fields))
+
+
+@receiver(pre_save, sender=Product)
+def remember_category_count_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._count_state = None
+    if raw or not _counts_affected(update_fields) or instance._state.adding or instance.pk is None:
+        return
+    instance._count_state = sender.objects.filter(pk=instance.pk).values_list('category_id', 'in_stock').first()
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _counts_affected(update_fields):
+        return
+    old = None if created else getattr(instance, '_count_state', None)
+    apply_count_change(old, (instance.category_id, instance.in_stock))
+
+
+@receiver(post_delete, sender=Product)
+def release_category_count(sender, instance, **kwargs):
+    apply_count_change((instance.category_id, instance.in_stock), None)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def clear_category_names(sender, **kwargs):
+    category_names.clear()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._counted_status = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    instance._counted_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, created, raw=False, **kwargs):
+    # New orders are recorded where their items are created (checkout_cart)
+    old_status = getattr(instance, '_counted_status', None)
+    if raw or created or old_status is None or is_counted(old_status) == is_counted(instance.status):
+        return
+    if backfill_pending(instance.pk):
+        return
+    record_order_sales(instance, sign=1 if is_counted(instance.status) else -1)
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_sales(sender, instance, **kwargs):
+    # Before the cascade removes the order's items
+    if is_counted(instance.status) and not backfill_pending(instance.pk):
+        record_order_sales(instance, sign=-1)
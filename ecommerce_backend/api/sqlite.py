@@ -0,0 +1,41 @@
+import re
+from django.conf import settings
+
+# SQLITE_PRAGMAS are run on every new SQLite connection (ApiConfig connects
+# apply_sqlite_pragmas to connection_created). journal_mode=wal is stored in
+# the database file and lets readers carry on while a transaction writes;
+# the others only last as long as the connection, which is why connections
+# are kept between requests (CONN_MAX_AGE).
+
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME_RE.match(name) or not PRAGMA_VALUE_RE.match(str(value)):
+            raise ValueError(f'Invalid SQLite pragma: {name} = {value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(sqlite_pragmas()):
+            cursor.execute(statement)
+
+
+def current_pragmas(connection, names=('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size')):
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
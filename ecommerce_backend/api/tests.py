@@ -1,3 +1,852 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .auth import user_cache
+from .carts import apply_cart_operations, parse_cart_operations
+from .catalog_cache import bump_version, get_version, mark_replica_synced
+from .categories import recount_categories
+from .facets import rebuild_facet_index
+from .models import (
+    Cart, Category, DailyCategorySales, DailyProductSales, DailySales, IdempotencyKey, Order, OrderItem,
+    Product, ProductFacet, Review, SalesBackfill, Wishlist,
+)
+from .query_advisor import analyze_queries, failures
+from .ratings import AGGREGATE_FIELDS, apply_review_rating, recompute_all_ratings
+from .replicas import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter, current_replica
+from .sales import backfill_sales_rollups
+from .sessions import SessionStore, write_behind
 
-# Create your tests here.
+
+def make_catalog(prices, categories=2):
+    """Products priced ``prices``, in ``categories`` categories, in creation order."""
+    categories = [
+        Category.objects.create(name=f'Test Category {i}', image='https://example.com/c.jpg')
+        for i in range(categories)
+    ]
+    return [
+        Product.objects.create(
+            name=f'Test Product {i}', description='A test product', price=Decimal(price),
+            sku=f'TEST-{i}', category=categories[i % len(categories)],
+        )
+        for i, price in enumerate(prices)
+    ]
+
+
+# Hash passwords inline and write sessions through, so tests need no worker
+# processes or background threads
+@override_settings(PASSWORD_HASHING_WORKERS=0, SESSION_WRITE_BEHIND_INTERVAL=0)
+class APITestCase(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        user_cache.clear()
+        self.client = APIClient()
+
+    def make_user(self, username='shopper', **extra_fields):
+        return User.objects.create_user(username=username, password='secret-pass-123', **extra_fields)
+
+    def log_in(self, user):
+        self.client.force_authenticate(user)
+
+
+class KeysetPaginationTests(APITestCase):
+    def walk(self, url, link):
+        """Follow ``link`` ('next' or 'previous') from ``url``; returns every page's ids."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_product_cursor_round_trip_with_tied_prices(self):
+        # Three prices shared by several products each, so pages split ties
+        products = make_catalog(['9.99', '4.50', '9.99', '4.50', '9.99', '12.00', '4.50', '9.99', '12.00', '9.99'])
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(len(expected), len(products))
+
+        forward = self.walk('/api/products/?pagination=cursor&sort_by=price_low&page_size=3', 'next')
+        self.assertEqual([len(page) for page in forward], [3, 3, 3, 1])
+        self.assertEqual(sum(forward, []), expected)
+
+        # Back from the last page through the previous links
+        last = self.client.get('/api/products/?pagination=cursor&sort_by=price_low&page_size=3')
+        while last.data['next']:
+            last = self.client.get(last.data['next'])
+        backward = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []), expected[:-1])
+
+    def test_descending_cursor_round_trip_with_tied_timestamps(self):
+        user = self.make_user()
+        for i in range(7):
+            Order.objects.create(
+                user=user, order_number=f'TEST-ORDER-{i}', total_amount=Decimal('10.00'),
+                shipping_address='1 Test Street', payment_method='credit_card',
+            )
+        # Two timestamps for all seven orders; only the id breaks the ties
+        ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+        first, second = Order.objects.get(pk=ids[0]).created_at, Order.objects.get(pk=ids[-1]).created_at
+        Order.objects.filter(pk__in=ids[:4]).update(created_at=first)
+        Order.objects.filter(pk__in=ids[4:]).update(created_at=second)
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.log_in(user)
+
+        forward = self.walk('/api/orders/?pagination=cursor&page_size=2', 'next')
+        self.assertEqual(sum(forward, []), expected)
+
+        response = self.client.get('/api/orders/?pagination=cursor&page_size=2')
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], expected[4:6])
+        backward = self.walk(response.data['previous'], 'previous')
+        self.assertEqual(backward, [expected[2:4], expected[0:2]])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class FastListSerializationTests(APITestCase):
+    def test_fast_list_bodies_match_the_serializer(self):
+        products = make_catalog(['9.99', '24.50', '24.50', '120.00', '7.25', '60.00'], categories=3)
+        for index, product in enumerate(products):
+            product.description = f'Soft cotton shirt number {index}'
+            product.original_price = product.price + 10 if index % 2 else None
+            product.colors = ['Black', 'Red'][:index % 3]
+            product.sizes = ['S', 'M'] if index % 2 else []
+            product.images = [f'https://example.com/{index}.jpg']
+            product.in_stock = index != 4
+            product.save()
+        Product.objects.filter(pk=products[0].pk).update(rating=Decimal('4.5'), reviews_count=2)
+
+        urls = [
+            '/api/products/',
+            '/api/products/?sort_by=price_low',
+            '/api/products/?sort_by=rating&page_size=2',
+            '/api/products/?search=cotton',
+            '/api/products/?search=shirt&sort_by=price_high',
+            '/api/products/?pagination=cursor&page_size=2',
+            '/api/products/?pagination=cursor&sort_by=price_low&page_size=4',
+            '/api/products/?color=Black&facets=1',
+            '/api/products/?category=Test%20Category%201&size=M&facets=1',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(FAST_LIST_SERIALIZATION=False):
+                    regular = self.client.get(url)
+                with override_settings(FAST_LIST_SERIALIZATION=True):
+                    fast = self.client.get(url)
+                self.assertEqual(regular.status_code, 200)
+                self.assertEqual(fast.status_code, 200)
+                self.assertTrue(regular.data['results'])
+                # Rendered by the fast path, not handed back to DRF
+                self.assertTrue(hasattr(regular, 'data'))
+                self.assertFalse(hasattr(fast, 'data'))
+                self.assertEqual(fast.content, regular.content)
+                self.assertEqual(fast['Content-Type'], regular['Content-Type'])
+
+        cursor = self.client.get('/api/products/?pagination=cursor&page_size=2').data['next']
+        with override_settings(FAST_LIST_SERIALIZATION=False):
+            regular = self.client.get(cursor)
+        with override_settings(FAST_LIST_SERIALIZATION=True):
+            fast = self.client.get(cursor)
+        self.assertEqual(fast.content, regular.content)
+
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.log_in(self.user)
+        self.products = make_catalog(['5.00', '7.50', '2.25', '10.00'])
+
+    def cart(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def batch(self, *operations):
+        return self.client.post('/api/cart/batch/', {'operations': list(operations)}, format='json')
+
+    def test_add_set_and_remove(self):
+        a, b, c, d = (product.id for product in self.products)
+        Cart.objects.create(user=self.user, product_id=a, quantity=2)
+        Cart.objects.create(user=self.user, product_id=b, quantity=1)
+
+        response = self.batch(
+            {'op': 'add', 'product': a, 'quantity': 3},
+            {'op': 'remove', 'product': b},
+            {'op': 'add', 'product': c},
+            {'op': 'set', 'product': d, 'quantity': 4},
+            {'op': 'set', 'product': c, 'quantity': 2},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart(), {a: 5, c: 2, d: 4})
+        self.assertEqual(response.data['total'], Decimal('69.50'))
+        self.assertEqual(response.data['count'], 11)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        operations = parse_cart_operations(
+            [{'op': 'add', 'product': product.id, 'quantity': 2} for product in self.products[:3]]
+            + [{'op': 'remove', 'product': self.products[3].id}]
+        )
+        Cart.objects.create(user=self.user, product=self.products[3], quantity=1)
+        # Lock, current lines, product check, DELETE, upsert, cart state
+        # and the savepoint around them
+        with self.assertNumQueries(8):
+            apply_cart_operations(self.user, operations)
+        self.assertEqual(self.cart(), {product.id: 2 for product in self.products[:3]})
+
+    def test_unknown_product_rolls_back_the_whole_batch(self):
+        a, b = self.products[0].id, self.products[1].id
+        Cart.objects.create(user=self.user, product_id=a, quantity=1)
+        response = self.batch(
+            {'op': 'set', 'product': a, 'quantity': 9},
+            {'op': 'add', 'product': b},
+            {'op': 'add', 'product': 999999},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', response.data['error'])
+        self.assertEqual(self.cart(), {a: 1})
+
+    def test_invalid_operation_rolls_back_the_whole_batch(self):
+        a = self.products[0].id
+        for operations in (
+            [{'op': 'add', 'product': a}, {'op': 'explode', 'product': a}],
+            [{'op': 'add', 'product': a}, {'op': 'add', 'product': a, 'quantity': 0}],
+            [{'op': 'add', 'product': a}, {'op': 'set', 'product': 'a', 'quantity': 1}],
+            [],
+        ):
+            response = self.batch(*operations)
+            self.assertEqual(response.status_code, 400, operations)
+        self.assertEqual(self.cart(), {})
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.log_in(self.user)
+        self.products = make_catalog([f'{i + 1}.50' for i in range(10)])
+
+    def checkout(self, size):
+        Cart.objects.bulk_create([
+            Cart(user=self.user, product=product, quantity=2) for product in self.products[:size]
+        ])
+        # Lock, cart read, order insert, item bulk insert, cart DELETE, three
+        # rollup upserts and the savepoint, then the order re-read (order
+        # and items)
+        with self.assertNumQueries(12):
+            response = self.client.post('/api/orders/create_from_cart/', {'shipping_address': '1 Test Street'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_checkout_query_count_is_constant(self):
+        for size in (1, 10):
+            response = self.checkout(size)
+            self.assertEqual(len(response.data['items']), size)
+            self.assertEqual(
+                Decimal(response.data['total_amount']),
+                sum(product.price * 2 for product in self.products[:size]),
+            )
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(OrderItem.objects.filter(order__user=self.user).count(), 11)
+
+    def test_empty_cart_is_rejected(self):
+        response = self.client.post('/api/orders/create_from_cart/', {'shipping_address': '1 Test Street'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class CartSummaryTests(APITestCase):
+    def test_update_quantity_invalidates_the_summary_after_the_write(self):
+        user = self.make_user()
+        self.log_in(user)
+        product = make_catalog(['4.00'])[0]
+        item = Cart.objects.create(user=user, product=product, quantity=1)
+        self.assertEqual(self.client.get('/api/cart/summary/').data['count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(f'/api/cart/{item.id}/update_quantity/', {'quantity': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.client.get('/api/cart/summary/').data, {'total': Decimal('12.00'), 'count': 3})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/cart/{item.id}/update_quantity/', {'quantity': 0}, format='json')
+        self.assertEqual(self.client.get('/api/cart/summary/').data['count'], 0)
+
+    def test_update_quantity_parses_the_quantity(self):
+        user = self.make_user()
+        self.log_in(user)
+        item = Cart.objects.create(user=user, product=make_catalog(['4.00'])[0], quantity=1)
+
+        response = self.client.post(f'/api/cart/{item.id}/update_quantity/', {'quantity': '3'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 3)
+        response = self.client.post(f'/api/cart/{item.id}/update_quantity/', {'quantity': '2'})
+        self.assertEqual(response.status_code, 200)
+        for quantity in ('three', None):
+            response = self.client.post(f'/api/cart/{item.id}/update_quantity/', {'quantity': quantity}, format='json')
+            self.assertEqual(response.status_code, 400)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+
+
+class QueryPlanTests(APITestCase):
+    def test_catalog_cart_and_order_queries_use_indexes(self):
+        products = make_catalog([f'{10 + i * 7}.00' for i in range(30)], categories=3)
+        for index, product in enumerate(products):
+            product.colors = ['Black', 'Red'] if index % 2 else ['Blue']
+            product.sizes = ['M']
+            product.save()
+        user = self.make_user()
+        Cart.objects.create(user=user, product=products[0], quantity=1)
+        Wishlist.objects.create(user=user, product=products[1])
+        Review.objects.create(user=user, product=products[0], rating=4, comment='Good')
+        order = Order.objects.create(
+            user=user, order_number='TEST-ORDER', total_amount=Decimal('10.00'),
+            shipping_address='1 Test Street', payment_method='credit_card',
+        )
+        OrderItem.objects.create(order=order, product=products[0], quantity=1, price=products[0].price)
+        rebuild_facet_index()
+
+        report = analyze_queries()
+        names = {entry['name'] for entry in report}
+        for name in ('products list [(none)]', 'cart list', 'wishlist list', 'orders list', 'order detail', 'wishlist ids'):
+            self.assertIn(name, names)
+        self.assertEqual(
+            [(entry['name'], entry['findings']) for entry in failures(report)], [],
+        )
+
+
+# Long enough that the background thread never flushes during a test
+@override_settings(SESSION_WRITE_BEHIND_INTERVAL=3600)
+class WriteBehindSessionTests(APITestCase):
+    def tearDown(self):
+        write_behind.flush()
+
+    def saved_session(self):
+        session = SessionStore()
+        session['cart_hint'] = 42
+        session.save()
+        return session.session_key
+
+    def test_save_reaches_the_database_on_flush(self):
+        session_key = self.saved_session()
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+        self.assertIsNotNone(write_behind.peek(session_key))
+
+        self.assertEqual(write_behind.flush(), 1)
+        self.assertIsNone(write_behind.peek(session_key))
+        self.assertEqual(Session.objects.get(session_key=session_key).get_decoded(), {'cart_hint': 42})
+
+    def test_session_missing_from_the_cache_loads_from_the_queue(self):
+        session_key = self.saved_session()
+        caches['sessions'].clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session_key).load(), {'cart_hint': 42})
+
+    def test_deleted_session_is_not_loaded_before_the_flush(self):
+        session_key = self.saved_session()
+        write_behind.flush()
+        SessionStore(session_key).delete()
+        caches['sessions'].clear()
+        self.assertEqual(SessionStore(session_key).load(), {})
+        write_behind.flush()
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+
+
+class CachedUserTests(APITestCase):
+    def test_profile_update_invalidates_the_cached_user(self):
+        user = self.make_user(first_name='Old')
+        self.assertTrue(self.client.login(username='shopper', password='secret-pass-123'))
+        self.assertEqual(self.client.get('/api/profile/').data['first_name'], 'Old')
+        self.assertIsNotNone(user_cache.get(user.pk))
+
+        # Warm requests resolve the user without touching the user table
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/profile/')
+        self.assertFalse([query for query in queries if 'auth_user' in query['sql']])
+
+        response = self.client.put('/api/profile/', {'first_name': 'New'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(user_cache.get(user.pk))
+        self.assertEqual(self.client.get('/api/profile/').data['first_name'], 'New')
+
+
+class IdempotencyTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog([Decimal('10.00')])[0]
+        self.user = self.make_user()
+        self.log_in(self.user)
+
+    def add_to_cart(self, quantity=1, key='add-1'):
+        return self.client.post('/api/cart/', {'product': self.product.id, 'quantity': quantity},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response_byte_for_byte(self):
+        first = self.add_to_cart()
+        self.assertEqual(first.status_code, 201)
+        retry = self.add_to_cart()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 1)
+
+    def test_key_reused_with_a_different_body_is_rejected(self):
+        self.add_to_cart(quantity=1)
+        response = self.add_to_cart(quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 1)
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.1)
+    def test_key_still_in_progress_returns_conflict(self):
+        self.add_to_cart()
+        # Put the key back in the state a first request holds it while running
+        IdempotencyKey.objects.filter(user=self.user, key='add-1').update(status_code=None, response=None)
+        Cart.objects.filter(user=self.user).delete()
+
+        response = self.add_to_cart()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_response_is_stored_in_the_views_transaction(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/create_from_cart/', {'shipping_address': '1 Test Street'},
+                                        format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 201)
+
+        statements = [query['sql'] for query in queries]
+        order_insert = next(i for i, sql in enumerate(statements) if sql.startswith('INSERT INTO "api_order"'))
+        key_update = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE "api_idempotencykey"'))
+        # Some savepoint opened before the order insert is released only after the key is completed
+        savepoints = {sql.split()[-1]: i for i, sql in enumerate(statements[:order_insert]) if sql.startswith('SAVEPOINT')}
+        self.assertTrue(any(
+            sql.startswith('RELEASE SAVEPOINT') and sql.split()[-1] in savepoints
+            for sql in statements[key_update:]
+        ))
+
+    def test_key_is_scoped_to_the_user(self):
+        self.add_to_cart()
+        other = self.make_user(username='other')
+        self.log_in(other)
+        response = self.add_to_cart()
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Cart.objects.get(user=other).quantity, 1)
+        self.assertEqual(IdempotencyKey.objects.filter(key='add-1').count(), 2)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalog(['5.00', '12.50', '20.00'])
+        self.user = self.make_user()
+        self.log_in(self.user)
+
+    def checkout(self, *quantities):
+        Cart.objects.bulk_create([
+            Cart(user=self.user, product=product, quantity=quantity)
+            for product, quantity in zip(self.products, quantities) if quantity
+        ])
+        response = self.client.post('/api/orders/create_from_cart/', {'shipping_address': '1 Test Street'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['id'])
+
+    def rollups(self):
+        # Cancellations leave zeroed rows behind that a rebuild does not create
+        return {
+            model.__name__: sorted(
+                model.objects.exclude(orders=0).values_list(*key_fields, 'orders', 'units', 'revenue')
+            )
+            for model, key_fields in (
+                (DailySales, ['date']),
+                (DailyCategorySales, ['date', 'category']),
+                (DailyProductSales, ['date', 'product']),
+            )
+        }
+
+    def test_live_rollups_match_a_backfill(self):
+        self.checkout(1, 2)
+        self.checkout(0, 1, 3)
+        cancelled = self.checkout(4)
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        reopened = self.checkout(2, 0, 1)
+        reopened.status = 'cancelled'
+        reopened.save()
+        reopened.status = 'pending'
+        reopened.save()
+        self.checkout(1).delete()
+
+        live = self.rollups()
+        self.assertEqual(live['DailySales'][0][1:], (3, 10, Decimal('132.50')))
+        self.assertEqual(backfill_sales_rollups(chunk_size=2), 4)
+        self.assertEqual(self.rollups(), live)
+
+    def test_orders_changed_during_a_backfill_are_counted_once(self):
+        first, second, third, fourth = (self.checkout(1, 1), self.checkout(2), self.checkout(0, 3), self.checkout(0, 0, 1))
+        third.status = 'cancelled'
+        third.save()
+
+        def change_orders(done, after, last_id):
+            # Live changes between chunks: the first order has been counted,
+            # the rest not yet
+            if after == first.pk:
+                first.status = 'cancelled'
+                first.save()
+                second.status = 'cancelled'
+                second.save()
+                third.status = 'pending'
+                third.save()
+                fourth.delete()
+
+        self.assertEqual(backfill_sales_rollups(chunk_size=1, progress=change_orders), 3)
+        live = self.rollups()
+        self.assertEqual(live['DailySales'][0][1:], (1, 3, Decimal('37.50')))
+        self.assertFalse(SalesBackfill.objects.exists())
+        backfill_sales_rollups()
+        self.assertEqual(self.rollups(), live)
+
+    def test_report_limit_is_validated(self):
+        self.checkout(1, 1, 1)
+        self.client.force_authenticate(self.make_user(username='staff', is_staff=True))
+        for limit, count in (('-1', 1), ('0', 1), ('2', 2), ('500', 3)):
+            response = self.client.get('/api/analytics/sales/products/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+        response = self.client.get('/api/analytics/sales/products/', {'limit': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+# 'default' stands in for a replica: the reads are the same, only the
+# recorded sync version decides whether a body may be cached
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaCatalogCacheTests(APITestCase):
+    def cache_status(self):
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def test_reads_from_a_lagging_replica_are_not_cached(self):
+        make_catalog([])
+        self.assertEqual([self.cache_status(), self.cache_status()], ['MISS', 'MISS'])
+
+        mark_replica_synced('default', get_version())
+        self.assertEqual([self.cache_status(), self.cache_status()], ['MISS', 'HIT'])
+
+        # A write the replica has not been synced with yet
+        bump_version()
+        self.assertEqual([self.cache_status(), self.cache_status()], ['MISS', 'MISS'])
+
+    def test_pinned_reads_bypass_the_cache(self):
+        make_catalog([])
+        mark_replica_synced('default', get_version())
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertFalse(self.client.get('/api/categories/').has_header('X-Cache'))
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaMiddlewareTests(APITestCase):
+    def writing_view(self, request):
+        self.seen_replica = current_replica()
+        ReplicaRouter().db_for_write(Product)
+        return HttpResponse()
+
+    def test_sync_handler(self):
+        middleware = ReplicaMiddleware(self.writing_view)
+        self.assertFalse(iscoroutinefunction(middleware))
+        response = middleware(RequestFactory().get('/api/products/'))
+        self.assertEqual(self.seen_replica, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(current_replica())
+
+    async def test_async_handler_is_not_adapted(self):
+        async def get_response(request):
+            return self.writing_view(request)
+
+        middleware = ReplicaMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/api/products/'))
+        self.assertEqual(self.seen_replica, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(current_replica())
+
+
+class CategoryCountTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.shoes, self.hats = (
+            Category.objects.create(name=name, image='https://example.com/c.jpg') for name in ('Shoes', 'Hats')
+        )
+
+    def make_product(self, sku, category, in_stock=True):
+        return Product.objects.create(
+            name=sku, description='A test product', price=Decimal('10.00'), sku=sku,
+            category=category, in_stock=in_stock,
+        )
+
+    def assertCounts(self, shoes, hats):
+        self.assertEqual(
+            dict(Category.objects.values_list('name', 'count')), {'Shoes': shoes, 'Hats': hats}
+        )
+
+    def test_counts_follow_product_writes(self):
+        boot = self.make_product('BOOT', self.shoes)
+        self.make_product('SANDAL', self.shoes)
+        self.make_product('CAP', self.hats, in_stock=False)
+        self.assertCounts(2, 0)
+
+        boot.in_stock = False
+        boot.save()
+        self.assertCounts(1, 0)
+        boot.category = self.hats
+        boot.in_stock = True
+        boot.save()
+        self.assertCounts(1, 1)
+
+        cap = Product.objects.get(sku='CAP')
+        cap.in_stock = True
+        cap.save(update_fields=['in_stock'])
+        self.assertCounts(1, 2)
+        # Unrelated fields read and change nothing: the savepoint pair and the UPDATE
+        cap.in_stock = False
+        with self.assertNumQueries(3):
+            cap.save(update_fields=['name'])
+        self.assertCounts(1, 2)
+
+        boot.delete()
+        self.assertCounts(1, 1)
+        recount_categories()
+        self.assertCounts(1, 1)
+
+    def test_count_rolls_back_with_the_product_write(self):
+        boot = self.make_product('BOOT', self.shoes)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                boot.category = self.hats
+                boot.save()
+                raise RuntimeError
+        self.assertCounts(1, 0)
+
+    def test_category_filter_follows_renames(self):
+        self.make_product('BOOT', self.shoes)
+        self.make_product('CAP', self.hats)
+
+        def skus(category):
+            return [row['sku'] for row in self.client.get('/api/products/', {'category': category}).data['results']]
+
+        self.assertEqual(skus('shoes'), ['BOOT'])
+        self.shoes.name = 'Boots'
+        self.shoes.save()
+        self.assertEqual(skus('boots'), ['BOOT'])
+        self.assertEqual(skus('shoes'), [])
+
+        # Renamed by another process: no local signal, only the version moves
+        Category.objects.filter(pk=self.hats.pk).update(name='Caps')
+        bump_version()
+        self.assertEqual(skus('caps'), ['CAP'])
+
+
+class RatingTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalog(['10.00', '20.00', '30.00'])
+
+    def review(self, product, ratings):
+        """Post one review per rating through the API, each by a new user."""
+        users = User.objects.bulk_create([
+            User(username=f'reviewer-{product.pk}-{i}') for i in range(len(ratings))
+        ])
+        for user, rating in zip(users, ratings):
+            self.log_in(user)
+            response = self.client.post(
+                f'/api/products/{product.pk}/add_review/', {'rating': rating, 'comment': 'Fine'}, format='json'
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def aggregates(self):
+        return {
+            product['id']: product
+            for product in Product.objects.order_by('id').values('id', *AGGREGATE_FIELDS)
+        }
+
+    def test_incremental_aggregates_match_a_recompute(self):
+        # 87 stars over 20 reviews is 4.35, which rounds half up to 4.4
+        self.review(self.products[0], [5] * 15 + [2, 2, 2, 3, 3])
+        self.review(self.products[1], [1, 1, 2])
+        self.review(self.products[2], [2, 3, 3])
+
+        detail = self.client.get(f'/api/products/{self.products[0].pk}/').json()
+        self.assertEqual(detail['rating'], '4.4')
+        self.assertEqual(detail['reviews_count'], 20)
+        self.assertEqual(detail['rating_histogram'], {'1': 0, '2': 3, '3': 2, '4': 0, '5': 15})
+        live = self.aggregates()
+        self.assertEqual(live[self.products[0].pk]['rating_sum'], 87)
+        self.assertEqual(live[self.products[1].pk]['rating'], Decimal('1.3'))
+        self.assertEqual(live[self.products[2].pk]['rating'], Decimal('2.7'))
+
+        self.assertEqual(recompute_all_ratings(batch_size=2), 3)
+        self.assertEqual(self.aggregates(), live)
+
+    def test_update_reads_current_counts_not_the_callers_copy(self):
+        product = self.products[0]
+        stale = Product.objects.get(pk=product.pk)
+        apply_review_rating(product.pk, 5)
+        apply_review_rating(product.pk, 4)
+        self.assertEqual(stale.reviews_count, 0)
+        product.refresh_from_db()
+        self.assertEqual((product.rating_sum, product.reviews_count, product.rating), (9, 2, Decimal('4.5')))
+        self.assertEqual((product.rating_4_count, product.rating_5_count), (1, 1))
+        with self.assertRaises(ValueError):
+            apply_review_rating(product.pk, 6)
+
+
+
+class FacetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalog(['10.00', '40.00', '120.00', '60.00'])
+        attributes = [(['Black', 'Red'], ['S', 'M']), (['Black'], ['L']), (['Red'], ['S']), ([], [])]
+        for product, (colors, sizes) in zip(self.products, attributes):
+            product.colors, product.sizes = colors, sizes
+            product.save()
+
+    def skus(self, params):
+        results = self.client.get('/api/products/', params).data['results']
+        return sorted(row['sku'] for row in results)
+
+    def postings(self):
+        return set(ProductFacet.objects.values_list('product_id', 'facet', 'value'))
+
+    def test_filter_by_facet_values(self):
+        self.assertEqual(self.skus({'color': 'Black'}), ['TEST-0', 'TEST-1'])
+        self.assertEqual(self.skus({'color': 'Black,Red'}), ['TEST-0', 'TEST-1', 'TEST-2'])
+        self.assertEqual(self.skus({'color': 'Red', 'size': 'S'}), ['TEST-0', 'TEST-2'])
+        self.assertEqual(self.skus({'color': 'Red', 'size': 'L'}), [])
+        self.assertEqual(self.skus({'price': '25-50'}), ['TEST-1'])
+        self.assertEqual(self.skus({'category': 'Test Category 1', 'color': 'Black'}), ['TEST-1'])
+
+    def test_counts_leave_out_the_facets_own_filter(self):
+        facets = self.client.get('/api/products/', {'color': 'Black', 'facets': '1'}).data['facets']
+        # Every color is counted over all products, so Red can still be picked
+        self.assertEqual(facets['color'], [{'value': 'Black', 'count': 2}, {'value': 'Red', 'count': 2}])
+        # The other facets only count Black products
+        self.assertEqual(facets['size'], [
+            {'value': 'L', 'count': 1}, {'value': 'M', 'count': 1}, {'value': 'S', 'count': 1},
+        ])
+        self.assertEqual(facets['category'], [
+            {'value': 'Test Category 0', 'count': 1}, {'value': 'Test Category 1', 'count': 1},
+        ])
+        # Price buckets in range order, not by count
+        self.assertEqual(facets['price'], [{'value': '0-25', 'count': 1}, {'value': '25-50', 'count': 1}])
+
+    def test_postings_follow_product_changes(self):
+        product = self.products[1]
+        product.colors = ['Blue']
+        product.price = Decimal('300.00')
+        product.category = self.products[0].category
+        product.save()
+
+        self.assertEqual(self.skus({'color': 'Black'}), ['TEST-0'])
+        self.assertEqual(self.skus({'color': 'Blue', 'price': '250+', 'category': 'Test Category 0'}), ['TEST-1'])
+        self.assertEqual(
+            {(facet, value) for product_id, facet, value in self.postings() if product_id == product.pk},
+            {('category', str(product.category_id)), ('color', 'Blue'), ('size', 'L'), ('price', '250+')},
+        )
+
+        # Saves that touch no facet field leave the postings alone
+        with CaptureQueriesContext(connection) as queries:
+            product.save(update_fields=['name'])
+        self.assertFalse([query for query in queries if 'api_productfacet' in query['sql']])
+
+        live = self.postings()
+        rebuild_facet_index()
+        self.assertEqual(self.postings(), live)
+        product.delete()
+        self.assertFalse(ProductFacet.objects.filter(product_id=product.pk).exists())
+
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(['10.00'])[0]
+        self.url = f'/api/products/{self.product.pk}/'
+
+    def assertCached(self, url=None):
+        url = url or self.url
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_matching_etag_returns_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        etag = first['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, first.content)
+
+    def test_catalog_writes_invalidate_cached_pages(self):
+        category_url = '/api/categories/'
+
+        def write(change):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+
+        self.assertCached()
+        etag = self.client.get(self.url)['ETag']
+        write(lambda: Product.objects.get(pk=self.product.pk).save())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+
+        self.assertCached()
+        self.log_in(self.make_user())
+        write(lambda: self.client.post(f'{self.url}add_review/', {'rating': 4, 'comment': 'Good'}, format='json'))
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['reviews_count'], 1)
+
+        self.assertCached(category_url)
+        category = self.product.category
+        category.name = 'Renamed'
+        write(category.save)
+        response = self.client.get(category_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('Renamed', [row['name'] for row in response.json()['results']])
+
+        # Rolled back writes leave the cache alone
+        self.assertCached()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.product.save()
+                raise RuntimeError
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+    def test_recompute_ratings_invalidates_cached_pages(self):
+        self.assertCached()
+        # Written behind the signals' back, as a bulk import would
+        Review.objects.bulk_create([Review(product=self.product, user=self.make_user(), rating=2, comment='Meh')])
+        call_command('recompute_ratings', stdout=StringIO())
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['rating'], '2.0')
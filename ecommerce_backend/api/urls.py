@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     CategoryViewSet, ProductViewSet, CartViewSet, WishlistViewSet,
-    OrderViewSet, UserProfileView, LoginView, LogoutView, RegisterView, CheckAuthView
+    OrderViewSet, UserProfileView, LoginView, LogoutView, RegisterView, CheckAuthView,
+    CatalogCacheStatsView, PasswordHashingStatsView, DailySalesView, CategorySalesView, ProductSalesView
 )
 
 router = DefaultRouter()
@@ -12,11 +15,23 @@ router.register(r'cart', CartViewSet, basename='cart')
 router.register(r'wishlist', WishlistViewSet, basename='wishlist')
 router.register(r'orders', OrderViewSet, basename='order')
 
-urlpatterns = [
-    path('', include(router.urls)),
-    path('auth/login/', LoginView.as_view(), name='login'),
-    path('auth/logout/', LogoutView.as_view(), name='logout'),
-    path('auth/register/', RegisterView.as_view(), name='register'),
-    path('auth/check/', CheckAuthView.as_view(), name='check-auth'),
-    path('profile/', UserProfileView.as_view(), name='user-profile'),
-] 
\ No newline at end of file
+
+def api_urlpatterns(async_catalog=False):
+    # The async catalog views shadow the router's routes for the same paths
+    patterns = list(async_views.urlpatterns) if async_catalog else []
+    return patterns + [
+        path('', include(router.urls)),
+        path('auth/login/', LoginView.as_view(), name='login'),
+        path('auth/logout/', LogoutView.as_view(), name='logout'),
+        path('auth/register/', RegisterView.as_view(), name='register'),
+        path('auth/check/', CheckAuthView.as_view(), name='check-auth'),
+        path('auth/hashing-stats/', PasswordHashingStatsView.as_view(), name='password-hashing-stats'),
+        path('profile/', UserProfileView.as_view(), name='user-profile'),
+        path('catalog/cache-stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
+        path('analytics/sales/daily/', DailySalesView.as_view(), name='sales-daily'),
+        path('analytics/sales/categories/', CategorySalesView.as_view(), name='sales-categories'),
+        path('analytics/sales/products/', ProductSalesView.as_view(), name='sales-products'),
+    ]
+
+
+urlpatterns = api_urlpatterns(getattr(settings, 'ASYNC_CATALOG_VIEWS', False))
@@ -6,22 +6,57 @@ from rest_framework.permissions import AllowAny
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Q, Avg
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from .models import Category, Product, Review, Cart, Wishlist, Order, OrderItem
+from functools import wraps
+from .models import Category, Product, Review, Cart, Wishlist, Order
 from .serializers import (
-    CategorySerializer, ProductSerializer, ProductListSerializer,
+    CategorySerializer, ProductSerializer, ProductListSerializer, ProductSearchSerializer,
+    PRODUCT_LIST_ROWS, PRODUCT_SEARCH_ROWS,
     ReviewSerializer, CartSerializer, WishlistSerializer,
-    OrderSerializer, OrderItemSerializer, CreateReviewSerializer,
+    OrderSerializer, OrderSummarySerializer, CreateReviewSerializer,
     UserSerializer
 )
+from .catalog import facet_querysets, filter_products, keyset_ordering, sort_products, wants_facets
+from .facets import facet_counts
+from .pagination import PageOrCursorPagination, ReviewPagination
+from .catalog_cache import CatalogCacheMixin, get_stats, reset_stats
+from .checkout import checkout_cart, generate_order_number
+from .sales import category_sales, daily_sales, product_sales, record_order_sales, report_range
+from .carts import (
+    CartBatchError, add_to_cart, apply_cart_operations, cart_totals, get_cart_summary, invalidate_cart_summary,
+    parse_cart_operations
+)
+from .wishlists import get_wishlist_ids, invalidate_wishlist_ids, toggle_wishlist
+from . import fastpath
+from .idempotency import idempotent
+from .passwords import AuthBusy, create_user, password_pool
+from .query_plans import (
+    QueryPlanMixin, PRODUCT_LIST_PLAN, PRODUCT_DETAIL_PLAN, REVIEW_LIST_PLAN,
+    CART_PLAN, WISHLIST_PLAN, ORDER_PLAN, ORDER_SUMMARY_PLAN
+)
 
 # Authentication Views
+def admission_controlled(method):
+    # Password hashing is expensive; shed auth requests beyond AUTH_MAX_PENDING
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        try:
+            with password_pool.admit():
+                return method(self, request, *args, **kwargs)
+        except AuthBusy:
+            return Response(
+                {'error': 'Too many sign-in requests, please try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'}
+            )
+    return wrapper
+
 @method_decorator(csrf_exempt, name='dispatch')
 class LoginView(APIView):
     permission_classes = [AllowAny]
 
+    @admission_controlled
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
@@ -50,6 +85,7 @@ class LogoutView(APIView):
 class RegisterView(APIView):
     permission_classes = [AllowAny]
 
+    @admission_controlled
     def post(self, request):
         username = request.data.get('username')
         email = request.data.get('email')
@@ -67,7 +103,7 @@ class RegisterView(APIView):
             return Response({'error': 'Email already exists'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            user = User.objects.create_user(
+            user = create_user(
                 username=username,
                 email=email,
                 password=password,
@@ -91,60 +127,84 @@ class CheckAuthView(APIView):
         return Response({'authenticated': False})
 
 # Existing Views...
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cached_actions = ('list', 'products')
+    query_plans = {
+        'products': PRODUCT_LIST_PLAN,
+    }
 
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         category = self.get_object()
-        products = Product.objects.filter(category=category)
+        products = self.plan_queryset(Product.objects.filter(category=category))
         serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CatalogCacheMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
+    pagination_class = PageOrCursorPagination
+    cached_actions = ('retrieve', 'featured', 'related')
+    query_plans = {
+        'list': PRODUCT_LIST_PLAN,
+        'retrieve': PRODUCT_DETAIL_PLAN,
+        'featured': PRODUCT_LIST_PLAN,
+        'related': PRODUCT_LIST_PLAN,
+        'reviews': REVIEW_LIST_PLAN,
+    }
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return ProductSerializer
+        if self.action == 'list' and self.request.query_params.get('search'):
+            return ProductSearchSerializer
         return ProductListSerializer
 
     def get_queryset(self):
-        queryset = Product.objects.all()
-        
-        # Filter by category
-        category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category__name__icontains=category)
-        
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price', None)
-        max_price = self.request.query_params.get('max_price', None)
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-        
-        # Search by name
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
-        
-        # Sort by
-        sort_by = self.request.query_params.get('sort_by', None)
-        if sort_by == 'price_low':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_high':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'rating':
-            queryset = queryset.order_by('-rating')
-        elif sort_by == 'newest':
-            queryset = queryset.order_by('-created_at')
-        
-        return queryset
+        queryset = self.filter_products(self.plan_queryset(Product.objects.all()))
+        return sort_products(queryset, self.request.query_params)
+
+    def filter_products(self, queryset, skip_facet=None):
+        return filter_products(queryset, self.request.query_params, skip_facet)
+
+    def get_facets(self):
+        params = self.request.query_params
+        return {facet: facet_counts(facet, product_ids) for facet, product_ids in facet_querysets(params)}
+
+    def wants_facets(self):
+        return wants_facets(self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        response = self.fast_list(request) if fastpath.is_enabled(request) else None
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            if self.wants_facets() and isinstance(response.data, dict):
+                response.data['facets'] = self.get_facets()
+        return response
+
+    def fast_list(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.get_serializer_class() is ProductSearchSerializer:
+            if 'search_snippet' not in queryset.query.extra_select:
+                return None
+            rows = PRODUCT_SEARCH_ROWS
+        else:
+            rows = PRODUCT_LIST_ROWS
+
+        # Let the keyset paginator read cursor values out of the row tuples
+        self.keyset_row_fields = rows.columns
+        queryset = rows.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return fastpath.json_response(rows.render(queryset))
+        data = self.get_paginated_response(rows.render(page)).data
+        if self.wants_facets():
+            data['facets'] = self.get_facets()
+        return fastpath.json_response(data)
+
+    def get_keyset_ordering(self):
+        return keyset_ordering(self.request.query_params)
 
     @action(detail=True, methods=['post'])
     def add_review(self, request, pk=None):
@@ -158,9 +218,18 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def reviews(self, request, pk=None):
+        get_object_or_404(Product.objects.only('id'), pk=pk)
+        reviews = self.plan_queryset(Review.objects.filter(product_id=pk))
+        paginator = ReviewPagination()
+        page = paginator.paginate_queryset(reviews, request)
+        serializer = ReviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured_products = Product.objects.filter(rating__gte=4.0)[:8]
+        featured_products = self.plan_queryset(Product.objects.filter(rating__gte=4.0))[:8]
         serializer = ProductListSerializer(featured_products, many=True)
         return Response(serializer.data)
 
@@ -169,126 +238,193 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         product_id = request.query_params.get('product_id')
         if product_id:
             try:
-                product = Product.objects.get(id=product_id)
-                related_products = Product.objects.filter(
-                    category=product.category
-                ).exclude(id=product_id)[:4]
+                # Precomputed by build_related_index: one lookup on (product, rank)
+                related_products = list(self.plan_queryset(
+                    Product.objects.filter(related_by__product_id=product_id).order_by('related_by__rank')
+                )[:4])
+                if related_products:
+                    serializer = ProductListSerializer(related_products, many=True)
+                    return Response(serializer.data)
+
+                # Not indexed yet (e.g. a new product): fall back to its category
+                product = Product.objects.only('id', 'category').get(id=product_id)
+                related_products = self.plan_queryset(Product.objects.filter(
+                    category_id=product.category_id
+                ).exclude(id=product_id))[:4]
                 serializer = ProductListSerializer(related_products, many=True)
                 return Response(serializer.data)
-            except Product.DoesNotExist:
+            except (Product.DoesNotExist, ValueError):
                 return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'error': 'product_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_plans = {
+        'default': CART_PLAN,
+    }
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return self.plan_queryset(Cart.objects.filter(user=self.request.user))
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        try:
+            product = Product.objects.get(id=request.data.get('product'))
+            quantity = int(request.data.get('quantity', 1))
+        except (Product.DoesNotExist, TypeError, ValueError):
+            return Response({'error': 'Valid product and quantity required'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity <= 0:
+            return Response({'error': 'Quantity must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cart_item, created = add_to_cart(request.user, product, quantity)
+        serializer = CartSerializer(cart_item)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_cart_summary(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_cart_summary(self.request.user.pk)
 
     @action(detail=False, methods=['get'])
     def total(self, request):
         cart_items = self.get_queryset()
-        total = sum(item.product.price * item.quantity for item in cart_items)
-        count = sum(item.quantity for item in cart_items)
+        totals = cart_totals(Cart.objects.filter(user=request.user))
         return Response({
-            'total': total,
-            'count': count,
+            'total': totals['total'],
+            'count': totals['count'],
             'items': CartSerializer(cart_items, many=True).data
         })
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        return Response(get_cart_summary(request.user))
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def batch(self, request):
+        # {"operations": [{"op": "add"|"set"|"remove", "product": id, "quantity": n}, ...]}
+        try:
+            body = request.data if isinstance(request.data, dict) else {}
+            operations = parse_cart_operations(body.get('operations'))
+            state = apply_cart_operations(request.user, operations)
+        except CartBatchError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(state)
+
     @action(detail=True, methods=['post'])
     def update_quantity(self, request, pk=None):
-        cart_item = get_object_or_404(Cart, id=pk, user=request.user)
-        quantity = request.data.get('quantity', 1)
-        
+        cart_item = get_object_or_404(self.get_queryset(), id=pk)
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return Response({'error': 'Valid quantity required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if quantity <= 0:
+                cart_item.delete()
+            else:
+                cart_item.quantity = quantity
+                cart_item.save()
+            invalidate_cart_summary(request.user.pk)
         if quantity <= 0:
-            cart_item.delete()
             return Response({'message': 'Item removed from cart'}, status=status.HTTP_200_OK)
         
-        cart_item.quantity = quantity
-        cart_item.save()
         serializer = CartSerializer(cart_item)
         return Response(serializer.data)
 
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_plans = {
+        'default': WISHLIST_PLAN,
+    }
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        return self.plan_queryset(Wishlist.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        invalidate_wishlist_ids(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        invalidate_wishlist_ids(self.request.user.pk)
 
     @action(detail=False, methods=['post'])
     def toggle(self, request):
         product_id = request.data.get('product_id')
         if not product_id:
             return Response({'error': 'product_id required'}, status=status.HTTP_400_BAD_REQUEST)
-        
+
         try:
-            product = Product.objects.get(id=product_id)
-            wishlist_item, created = Wishlist.objects.get_or_create(
-                user=request.user,
-                product=product
-            )
-            
-            if not created:
-                wishlist_item.delete()
-                return Response({'message': 'Removed from wishlist'}, status=status.HTTP_200_OK)
-            
-            return Response({'message': 'Added to wishlist'}, status=status.HTTP_201_CREATED)
-        except Product.DoesNotExist:
+            added = toggle_wishlist(request.user, product_id)
+        except (TypeError, ValueError):
+            added = None
+        if added is None:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        if added:
+            return Response({'message': 'Added to wishlist'}, status=status.HTTP_201_CREATED)
+        return Response({'message': 'Removed from wishlist'}, status=status.HTTP_200_OK)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def ids(self, request):
+        # Which of ?product_ids=1,2,3 are wishlisted (all of them without it)
+        ids = get_wishlist_ids(request.user)
+        requested = request.query_params.get('product_ids')
+        if requested:
+            try:
+                ids = ids.intersection(int(value) for value in requested.split(',') if value.strip())
+            except ValueError:
+                return Response({'error': 'product_ids must be comma-separated integers'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'product_ids': sorted(ids)})
+
+class OrderViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PageOrCursorPagination
+    query_plans = {
+        'default': ORDER_PLAN,
+        'list': ORDER_SUMMARY_PLAN,
+    }
+
+    def wants_full_list(self):
+        # ?view=full lists orders with their items, as the detail endpoint does
+        return self.action == 'list' and self.request.query_params.get('view') == 'full'
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+        return self.plan_queryset(queryset, action='retrieve' if self.wants_full_list() else None)
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not self.wants_full_list():
+            return OrderSummarySerializer
+        return OrderSerializer
+
+    def get_keyset_ordering(self):
+        return ('-created_at', '-id')
 
     def perform_create(self, serializer):
-        # Generate order number
-        import uuid
-        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        serializer.save(user=self.request.user, order_number=order_number)
+        with transaction.atomic():
+            order = serializer.save(user=self.request.user, order_number=generate_order_number())
+            record_order_sales(order, lines=[])
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def create_from_cart(self, request):
-        cart_items = Cart.objects.filter(user=request.user)
-        if not cart_items.exists():
-            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate total
-        total_amount = sum(item.product.price * item.quantity for item in cart_items)
-        
-        # Create order
-        import uuid
-        order = Order.objects.create(
-            user=request.user,
-            order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
-            total_amount=total_amount,
+        order = checkout_cart(
+            request.user,
             shipping_address=request.data.get('shipping_address', ''),
             payment_method=request.data.get('payment_method', 'credit_card')
         )
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-        
-        # Clear cart
-        cart_items.delete()
-        
+        if order is None:
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Re-read through the order query plan: two queries whatever the size
+        order = self.plan_queryset(Order.objects.filter(pk=order.pk)).get()
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -305,3 +441,54 @@ class UserProfileView(APIView):
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+    def delete(self, request):
+        reset_stats()
+        return Response(get_stats())
+
+class PasswordHashingStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(password_pool.stats())
+
+    def delete(self, request):
+        password_pool.reset_stats()
+        return Response(password_pool.stats())
+
+class SalesReportView(APIView):
+    # Staff reports served from the daily sales rollups (api/sales.py)
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            start, end = report_range(params)
+            category = int(params['category']) if params.get('category') else None
+            product = int(params['product']) if params.get('product') else None
+            limit = max(1, min(int(params.get('limit', 20)), 100))
+        except ValueError as e:
+            return Response({'error': f'Invalid report parameters: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'start': start,
+            'end': end,
+            'results': self.report(start, end, category=category, product=product, limit=limit),
+        })
+
+class DailySalesView(SalesReportView):
+    def report(self, start, end, category, product, limit):
+        return daily_sales(start, end, category_id=category, product_id=product)
+
+class CategorySalesView(SalesReportView):
+    def report(self, start, end, category, product, limit):
+        return category_sales(start, end)
+
+class ProductSalesView(SalesReportView):
+    def report(self, start, end, category, product, limit):
+        return product_sales(start, end, category_id=category, limit=limit)
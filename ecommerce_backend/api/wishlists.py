@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from .models import Product, Wishlist
+
+IDS_TIMEOUT = 300
+
+
+def ids_key(user_id):
+    return f'wishlist:ids:{user_id}'
+
+
+def wishlist_ids_queryset(user):
+    # Covered by the (user, product) unique index
+    return Wishlist.objects.filter(user=user).values_list('product_id', flat=True)
+
+
+def get_wishlist_ids(user):
+    """Product ids in the user's wishlist, as a frozenset."""
+    key = ids_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(wishlist_ids_queryset(user))
+        cache.set(key, ids, IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_wishlist_ids(user_id):
+    # After commit, so a concurrent reader cannot re-cache the old ids
+    transaction.on_commit(lambda: cache.delete(ids_key(user_id)))
+
+
+def toggle_wishlist(user, product_id):
+    """
+    Remove the product from the wishlist, or add it if it was not there: a
+    DELETE, then an INSERT if nothing was deleted. Returns True if added,
+    False if removed and None if there is no such product.
+    """
+    try:
+        with transaction.atomic():
+            removed, _ = Wishlist.objects.filter(user=user, product_id=product_id).delete()
+            if not removed:
+                Wishlist.objects.create(user=user, product_id=product_id)
+    except IntegrityError:
+        # A missing product fails the foreign key; a concurrent add of the
+        # same product fails the unique constraint and leaves it added
+        if not Product.objects.filter(pk=product_id).exists():
+            return None
+        removed = False
+    invalidate_wishlist_ids(user.pk)
+    return not removed
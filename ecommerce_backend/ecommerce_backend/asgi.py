@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
+# Requests run on a new thread each, which would strand persistent connections
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
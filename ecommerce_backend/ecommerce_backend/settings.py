@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,9 +84,93 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections (and their pragmas and page cache) between
+        # requests. Only a WSGI server reuses them: ASGI runs every request
+        # on a new thread, so asgi.py defaults this to 0
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN, so a transaction that reads and
+            # then writes waits busy_timeout for it instead of failing with
+            # "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Run on every new SQLite connection (api/sqlite.py). WAL lets catalog reads
+# proceed while a checkout writes; synchronous=normal is durable in WAL mode
+# except for the last transactions before a power loss. cache_size is in KiB
+# when negative, mmap_size in bytes, busy_timeout in milliseconds.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -32768,
+    'mmap_size': 268435456,
+}
+
+# Read replicas for catalog and review reads (api/replicas.py): SQLite files
+# copied from the primary by `manage.py sync_replicas`, e.g.
+# DATABASE_REPLICAS=replica1.sqlite3,replica2.sqlite3. Writes always go to
+# 'default'; after one, that client reads the primary for
+# REPLICA_PIN_SECONDS, which should exceed the sync interval.
+REPLICA_DATABASES = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / name.strip(),
+        'OPTIONS': {},
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{index}')
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '30'))
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Backend for every cache alias: 'locmem' (per process), 'file' (shared by
+# processes on one host) or 'redis' (any Redis-compatible server, e.g. a local
+# redis-server or valkey; uses the `redis` package). Use a shared backend
+# when running several worker processes so invalidations reach all of them.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_URL = os.environ.get('CACHE_URL', 'redis://127.0.0.1:6379/1')
+
+
+def cache_config(alias, max_entries):
+    if CACHE_BACKEND == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache' / alias,
+            'OPTIONS': {'MAX_ENTRIES': max_entries},
+        }
+    if CACHE_BACKEND == 'redis':
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': alias,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': alias,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    # Small per-user entries such as cart summaries
+    'default': cache_config('default', 10000),
+    # Pre-rendered catalog API responses
+    'catalog': cache_config('catalog', 5000),
+    # Sessions, written behind to the database (api/sessions.py)
+    'sessions': cache_config('sessions', 50000),
+}
+
+# Seconds a rendered catalog response is kept; writes invalidate it sooner
+CATALOG_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,6 +221,8 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # CSRF Settings
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
@@ -146,6 +235,28 @@ CSRF_COOKIE_SECURE = False     # Set to True in production with HTTPS
 SESSION_COOKIE_SAMESITE = 'Lax'
 CSRF_COOKIE_SAMESITE = 'Lax'
 
+# Sessions live in the 'sessions' cache and are written to the database in
+# batches every SESSION_WRITE_BEHIND_INTERVAL seconds (0 writes through).
+# Several worker processes need a shared CACHE_BACKEND to see new sessions.
+SESSION_ENGINE = 'api.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_WRITE_BEHIND_INTERVAL = float(os.environ.get('SESSION_WRITE_BEHIND_INTERVAL', '5'))
+
+# Session users are resolved from a per-process cache for this many seconds
+AUTHENTICATION_BACKENDS = ['api.auth.CachedModelBackend']
+USER_CACHE_TIMEOUT = 15
+
+# Password hashing runs in this many worker processes (0 hashes inline);
+# login/register requests beyond AUTH_MAX_PENDING in progress get a 503
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', '2'))
+AUTH_MAX_PENDING = int(os.environ.get('AUTH_MAX_PENDING', '16'))
+
+# Responses to requests with an Idempotency-Key header are replayed for
+# retries for this many seconds; a retry of a request still running waits
+# up to IDEMPOTENCY_LOCK_TIMEOUT seconds for it
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -157,3 +268,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
+
+# Render hot list endpoints (product listing) from values_list() rows with
+# precompiled field mappers instead of DRF serializers; output is identical
+FAST_LIST_SERIALIZATION = os.environ.get('FAST_LIST_SERIALIZATION', '0') == '1'
+
+# Route catalog reads (product list/detail, featured, related, categories)
+# to the async views in api/async_views.py; only useful under ASGI
+ASYNC_CATALOG_VIEWS = os.environ.get('ASYNC_CATALOG_VIEWS', '0') == '1'
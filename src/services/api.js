@@ -81,6 +81,12 @@ class ApiService {
     return this.extractResults(data);
   }
 
+  async getProductsWithFacets(params = {}) {
+    // Full response: results plus facet counts for the current filters
+    const queryString = new URLSearchParams({ ...params, facets: 'true' }).toString();
+    return this.request(`/products/?${queryString}`);
+  }
+
   async getProduct(id) {
     return this.request(`/products/${id}/`);
   }
@@ -95,6 +101,15 @@ class ApiService {
     return this.extractResults(data);
   }
 
+  async getProductReviews(productId, cursorUrl = null) {
+    // Follow the `next` link of a previous page to load more reviews
+    if (cursorUrl) {
+      const response = await fetch(cursorUrl, { credentials: 'include' });
+      return response.json();
+    }
+    return this.request(`/products/${productId}/reviews/`);
+  }
+
   async addProductReview(productId, reviewData) {
     return this.request(`/products/${productId}/add_review/`, {
       method: 'POST',
@@ -150,6 +165,17 @@ class ApiService {
     return this.request('/cart/total/');
   }
 
+  async getCartSummary() {
+    return this.request('/cart/summary/');
+  }
+
+  async batchUpdateCart(operations) {
+    return this.request('/cart/batch/', {
+      method: 'POST',
+      body: JSON.stringify({ operations }),
+    });
+  }
+
   // Wishlist
   async getWishlist() {
     const data = await this.request('/wishlist/');
@@ -169,6 +195,12 @@ class ApiService {
     });
   }
 
+  async getWishlistIds(productIds) {
+    const query = productIds ? `?product_ids=${productIds.join(',')}` : '';
+    const data = await this.request(`/wishlist/ids/${query}`);
+    return data.product_ids;
+  }
+
   async toggleWishlist(productId) {
     return this.request('/wishlist/toggle/', {
       method: 'POST',
@@ -182,6 +214,10 @@ class ApiService {
     return this.extractResults(data);
   }
 
+  async getOrder(orderId) {
+    return this.request(`/orders/${orderId}/`);
+  }
+
   async createOrder(orderData) {
     return this.request('/orders/', {
       method: 'POST',